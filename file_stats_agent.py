@@ -9,41 +9,46 @@
 """
 
 import os
+import sys
 import asyncio
-from typing import Optional
-import dashscope
-from qwen_agent.agents import Assistant
-from qwen_agent.gui import WebUI
-from dotenv import load_dotenv
+import functools
+import logging
+import signal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-# 加载环境变量
-load_dotenv()
+logger = logging.getLogger("file_stats_agent")
 
-# 配置 DashScope
-dashscope.api_key = os.getenv('DASHSCOPE_API_KEY')
-print(dashscope.api_key)
-dashscope.timeout = 60  # 延长超时时间以处理大目录
+# 加载环境变量（已由shell导出时跳过.env解析，只读取本文件同目录下的.env）
+if not os.environ.get("DASHSCOPE_API_KEY"):
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"), override=False)
 
-def init_file_stats_agent():
-    """初始化文件统计智能助手
-    
-    配置说明：
-    - 使用 qwen-max 作为底层语言模型
-    - 设置系统角色为文件管理专家
-    - 集成文件统计MCP工具
-    
-    Returns:
-        Assistant: 配置好的文件统计助手实例
-    """
-    # LLM 模型配置
-    llm_cfg = {
-        'model': 'qwen-max',
-        'timeout': 60,
-        'retry_count': 3,
-    }
-    
-    # 系统角色设定 - 文件管理专家
-    system = """你是一个专业的文件管理助手，具备强大的文件分析和统计能力。
+def _env_int(name: str, default: int) -> int:
+    """读取整数环境变量，未设置或格式非法时记录警告并使用默认值"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("环境变量 %s=%r 不是整数，使用默认值 %d", name, value, default)
+        return default
+
+# 请求超时（秒）与重试次数，可通过环境变量按部署调整
+_DASHSCOPE_TIMEOUT = _env_int("DASHSCOPE_TIMEOUT", 60)
+_DASHSCOPE_RETRIES = _env_int("DASHSCOPE_RETRIES", 3)
+
+# LLM 模型配置（超时与重试放在 generate_cfg 中，由 qwen_agent 传给每次 DashScope 调用）
+_LLM_CFG: Dict[str, Any] = {
+    'model': 'qwen-max',
+    'generate_cfg': {
+        'max_retries': _DASHSCOPE_RETRIES,
+        'request_timeout': _DASHSCOPE_TIMEOUT,  # 默认60秒，大目录分析可适当延长
+    },
+}
+
+# 系统角色设定 - 文件管理专家
+_SYSTEM_PROMPT = """你是一个专业的文件管理助手，具备强大的文件分析和统计能力。
 
 核心能力：
 1. 文件统计：统计目录中的文件数量、总大小、平均大小等
@@ -73,34 +78,159 @@ def init_file_stats_agent():
 - 建议：发现3个重复文件，可节省500MB空间"
 """
 
-    # MCP工具配置 - 连接文件统计服务器
-    tools = [{
-        "type": "mcp",
-        "mcpServers": {
-            "file-stats": {
-                "command": "python",
-                "args": ["mcp_server.py"],
-                "transport": "stdio"
-            }
+# MCP工具配置 - 连接文件统计服务器
+_TOOLS = ({
+    "type": "mcp",
+    "mcpServers": {
+        "file-stats": {
+            "command": "python",
+            "args": ["mcp_server.py"],
+            "transport": "stdio"
         }
-    }]
+    }
+},)
+
+# 智能查询建议配置（Web界面）
+_CHATBOT_CONFIG: Dict[str, Any] = {
+    'prompt.suggestions': (
+        '统计当前目录的文件总数和总大小',
+        '按扩展名分类显示桌面目录的所有文件',
+        '找出下载目录中超过100MB的大文件',
+        '显示最近7天内修改过的所有文件',
+        '检查文档目录是否有重复文件',
+        '清理桌面目录的空文件夹',
+        '显示最近30天的文件时间线',
+        '统计2024-01-01到2024-12-31创建的文件',
+        '重命名文件 old_name.txt 为 new_name.txt',
+        '分析用户目录的磁盘空间使用情况',
+        '按周统计最近一个月的文件创建情况',
+        '查找并列出所有图片文件（jpg, png, gif）',
+        '统计代码目录中不同编程语言的文件数量',
+        '分析大文件并提供清理建议',
+        '创建最近修改文件的详细报告'
+    )
+}
+
+# 流式输出时每隔多少个增量块刷新一次终端
+_FLUSH_EVERY = 8
+
+# 终端模式保留的历史消息条数上限，按整轮对话裁剪（系统提示词由 Assistant 单独传入，不受影响）
+_HISTORY_MAXLEN = 32
+
+@functools.lru_cache(maxsize=1)
+def init_file_stats_agent() -> Any:
+    """初始化文件统计智能助手
+    
+    配置说明：
+    - 使用 qwen-max 作为底层语言模型
+    - 设置系统角色为文件管理专家
+    - 集成文件统计MCP工具
+    
+    创建过程会启动MCP子进程并完成工具发现，结果会被缓存，
+    重复调用直接返回同一个实例。MCP连接由 qwen_agent 的 MCPManager
+    在进程退出时（atexit）自行关闭，这里无需额外清理。
+    
+    Returns:
+        Assistant: 配置好的文件统计助手实例
+    """
+    # 延迟导入，仅在真正创建助手时加载 dashscope / qwen_agent
+    import dashscope
+    from qwen_agent.agents import Assistant
+    
+    # 配置 DashScope
+    # 未设置时不覆盖，保留 dashscope 从密钥文件读取的回退逻辑
+    api_key = os.getenv('DASHSCOPE_API_KEY')
+    if api_key:
+        dashscope.api_key = api_key
+    logger.debug("DashScope key present: %s", bool(dashscope.api_key))
     
     try:
         # 创建文件统计助手实例
         agent = Assistant(
-            llm=llm_cfg,
+            llm=_LLM_CFG,
             name='文件统计智能助手',
             description='智能文件分析与管理专家',
-            system_message=system,
-            function_list=tools,
+            system_message=_SYSTEM_PROMPT,
+            function_list=_TOOLS,
         )
-        print("文件统计智能助手初始化成功！")
+        logger.info("文件统计智能助手初始化成功")
         return agent
     except Exception as e:
-        print(f"文件统计助手初始化失败: {str(e)}")
+        logger.error("文件统计助手初始化失败: %s", e)
         raise
 
-def run_test_mode(query: str = "统计当前目录的文件情况"):
+def _render(text: str) -> None:
+    """输出面向用户的内容（直接写 stdout，不做额外格式化）"""
+    sys.stdout.write(text)
+
+def _stream_reply(
+    responses: Iterable[List[Any]],
+    out: Callable[[str], Any],
+    flush: Callable[[], Any],
+) -> Optional[List[Any]]:
+    """增量渲染流式回复，只输出相比上一次产出新增的文本
+    
+    Args:
+        responses: agent.run() 返回的生成器，每次产出截至当前的完整消息列表
+        out: 写输出的函数（如 sys.stdout.write）
+        flush: 刷新输出的函数
+    
+    Returns:
+        最后一次产出的消息列表，没有产出时返回None
+    """
+    last_response: Optional[List[Any]] = None
+    shown_index = -1  # 正在输出的消息下标
+    shown_len = 0     # 该消息已输出的字符数
+    
+    for chunk_no, response in enumerate(responses, 1):
+        last_response = response
+        if not response:
+            continue
+        
+        content = response[-1].get('content') or ''
+        if not isinstance(content, str):
+            content = str(content)
+        
+        # 出现新消息（如工具调用后的回答）时换行重新计数
+        if len(response) - 1 != shown_index:
+            if shown_index != -1:
+                out("\n")
+            shown_index = len(response) - 1
+            shown_len = 0
+        
+        if len(content) > shown_len:
+            out(content[shown_len:])
+            shown_len = len(content)
+        
+        if chunk_no % _FLUSH_EVERY == 0:
+            flush()
+    
+    out("\n")
+    flush()
+    return last_response
+
+def _trim_history(messages: List[Any], current_turn: int) -> None:
+    """按整轮对话裁剪历史，使其不超过 _HISTORY_MAXLEN 条
+    
+    一轮对话可能包含工具调用与工具结果等多条消息，按条丢弃会让历史以
+    孤立的 function_call/function 消息开头。这里在最早的、能满足上限的
+    用户消息处截断，保证历史总以 user 消息开头；当前这一轮始终保留。
+    
+    Args:
+        messages: 对话历史（原地修改）
+        current_turn: 当前这一轮用户消息在 messages 中的下标
+    """
+    if len(messages) <= _HISTORY_MAXLEN:
+        return
+    
+    cut = current_turn
+    for i in range(current_turn):
+        if messages[i].get('role') == 'user' and len(messages) - i <= _HISTORY_MAXLEN:
+            cut = i
+            break
+    del messages[:cut]
+
+def run_test_mode(query: str = "统计当前目录的文件情况") -> None:
     """测试模式 - 快速验证功能
     
     Args:
@@ -108,19 +238,18 @@ def run_test_mode(query: str = "统计当前目录的文件情况"):
     """
     try:
         agent = init_file_stats_agent()
-        messages = [{'role': 'user', 'content': query}]
+        messages: List[Dict[str, Any]] = [{'role': 'user', 'content': query}]
         
-        print("🧪 测试模式启动...")
-        print(f"查询: {query}")
-        print("-" * 50)
+        logger.info("测试模式启动")
+        _render(f"查询: {query}\n{'-' * 50}\n助手回复: ")
         
-        for response in agent.run(messages):
-            print('🤖 助手回复:', response)
+        # 与终端模式相同，边生成边输出新增的回复内容
+        _stream_reply(agent.run(messages), sys.stdout.write, sys.stdout.flush)
             
     except Exception as e:
-        print(f"❌ 测试失败: {str(e)}")
+        logger.error("测试失败: %s", e)
 
-def run_tui_mode():
+def run_tui_mode() -> None:
     """终端交互模式
     
     提供命令行交互界面，支持：
@@ -130,47 +259,61 @@ def run_tui_mode():
     """
     try:
         agent = init_file_stats_agent()
-        messages = []
+        messages: List[Any] = []
+        out = sys.stdout.write
+        flush = sys.stdout.flush
         
-        print("🚀 文件统计智能助手 - 终端模式")
-        print("支持的查询示例：")
-        print("• 统计桌面目录的文件情况")
-        print("• 按类型分类显示文档目录的文件")
-        print("• 找出下载目录超过500MB的大文件")
-        print("• 显示最近7天修改过的文件")
-        print("• 检查图片目录有没有重复文件")
-        print("• 把test.txt重命名为new_test.txt")
-        print("• 退出/quit - 退出程序")
-        print("-" * 50)
+        out(
+            "🚀 文件统计智能助手 - 终端模式\n"
+            "支持的查询示例：\n"
+            "• 统计桌面目录的文件情况\n"
+            "• 按类型分类显示文档目录的文件\n"
+            "• 找出下载目录超过500MB的大文件\n"
+            "• 显示最近7天修改过的文件\n"
+            "• 检查图片目录有没有重复文件\n"
+            "• 把test.txt重命名为new_test.txt\n"
+            "• 退出/quit - 退出程序\n"
+            f"{'-' * 50}\n"
+        )
         
         while True:
             try:
-                query = input("\n👤 请输入查询: ").strip()
+                out("\n请输入查询: ")
+                flush()
+                line = sys.stdin.readline()
+                if not line:  # EOF
+                    break
+                query = line.rstrip("\n").strip()
                 
                 if not query:
                     continue
                     
                 if query.lower() in ['退出', 'quit', 'exit']:
-                    print("👋 感谢使用，再见！")
+                    out("感谢使用，再见！\n")
                     break
                 
+                current_turn = len(messages)
                 messages.append({'role': 'user', 'content': query})
                 
-                print("\n🤖 正在分析...")
-                for response in agent.run(messages):
-                    print(f"回复: {response}")
-                    messages.extend(response)
+                out("\n回复: ")
+                # run() 每次流式产出的都是截至当前的完整回复，
+                # 逐块 extend 会把重复消息累积进历史，只在结束后追加最后一次
+                last_response = _stream_reply(agent.run(messages), out, flush)
+                
+                if last_response:
+                    messages.extend(last_response)
+                _trim_history(messages, current_turn)
                     
             except KeyboardInterrupt:
-                print("\n👋 程序已终止")
+                out("\n程序已终止\n")
                 break
             except Exception as e:
-                print(f"❌ 处理出错: {str(e)}")
+                logger.error("处理出错: %s", e)
                 
     except Exception as e:
-        print(f"❌ 启动终端模式失败: {str(e)}")
+        logger.error("启动终端模式失败: %s", e)
 
-def run_gui_mode():
+def run_gui_mode() -> None:
     """图形界面模式 - Web GUI
     
     提供专业的Web界面，特点：
@@ -179,63 +322,82 @@ def run_gui_mode():
     - 实时文件分析结果
     - 支持历史对话
     """
+    # 可选：使用 uvloop 驱动 Web 服务的事件循环，多会话并发时等待开销更低
     try:
-        agent = init_file_stats_agent()
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    
+    try:
+        # WebUI 会引入 gradio，只在图形界面模式下导入
+        from qwen_agent.gui import WebUI
         
-        # 智能查询建议配置
-        chatbot_config = {
-            'prompt.suggestions': [
-                '统计当前目录的文件总数和总大小',
-                '按扩展名分类显示桌面目录的所有文件',
-                '找出下载目录中超过100MB的大文件',
-                '显示最近7天内修改过的所有文件',
-                '检查文档目录是否有重复文件',
-                '清理桌面目录的空文件夹',
-                '显示最近30天的文件时间线',
-                '统计2024-01-01到2024-12-31创建的文件',
-                '重命名文件 old_name.txt 为 new_name.txt',
-                '分析用户目录的磁盘空间使用情况',
-                '按周统计最近一个月的文件创建情况',
-                '查找并列出所有图片文件（jpg, png, gif）',
-                '统计代码目录中不同编程语言的文件数量',
-                '分析大文件并提供清理建议',
-                '创建最近修改文件的详细报告'
-            ]
-        }
+        agent = init_file_stats_agent()
         
-        print("🌐 启动文件统计智能助手 Web界面...")
-        print("访问地址: http://localhost:8001")
+        logger.info("启动文件统计智能助手 Web界面")
+        _render("访问地址: http://localhost:8001\n")
         
         WebUI(
             agent,
-            chatbot_config=chatbot_config
+            chatbot_config=_CHATBOT_CONFIG
         ).run(port=8001)
         
     except Exception as e:
-        print(f"❌ 启动Web界面失败: {str(e)}")
-        print("请检查：")
-        print("1. DashScope API Key是否配置正确")
-        print("2. 端口8001是否被占用")
-        print("3. 网络连接是否正常")
+        logger.error(
+            "启动Web界面失败: %s\n"
+            "请检查：\n"
+            "1. DashScope API Key是否配置正确\n"
+            "2. 端口8001是否被占用\n"
+            "3. 网络连接是否正常",
+            e,
+        )
+
+# 运行模式 -> (入口函数, 帮助说明)；说明写成字面量，mypyc 编译后函数不保留文档字符串
+MODES: Dict[str, Tuple[Callable[[], None], str]] = {
+    'test': (run_test_mode, '测试模式'),
+    'tui': (run_tui_mode, '终端模式'),
+    'gui': (run_gui_mode, 'Web界面模式'),
+}
+
+def _print_help() -> None:
+    """打印使用方式"""
+    lines: List[str] = ["使用方式:"]
+    for mode, (_, summary) in MODES.items():
+        lines.append(f"python file_stats_agent.py {mode:<5} # {summary}")
+    lines.append("python file_stats_agent.py       # 默认Web界面模式")
+    _render("\n".join(lines) + "\n")
+
+def _log_level() -> int:
+    """读取 LOG_LEVEL 环境变量（如 DEBUG、INFO），未设置或取值非法时使用 WARNING"""
+    name = (os.getenv('LOG_LEVEL') or 'WARNING').strip().upper()
+    level = getattr(logging, name, None)
+    if isinstance(level, int):
+        return level
+    logger.warning("未知的日志级别 LOG_LEVEL=%r，使用 WARNING", name)
+    return logging.WARNING
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """命令行入口：按参数选择运行模式
+    
+    源码运行与 mypyc 编译后的扩展模块共用此入口（编译产物无法通过
+    ``python file_stats_agent.py`` 执行，需 ``import file_stats_agent`` 后调用）。
+    
+    Args:
+        argv: 命令行参数（不含程序名），None表示使用 sys.argv[1:]
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    
+    logging.basicConfig(level=_log_level())
+    
+    # SIGTERM 转为正常退出，确保 qwen_agent 注册的 atexit 清理能释放MCP连接
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # 默认启动Web界面
+    mode = argv[0].lower() if argv else 'gui'
+    entry = MODES.get(mode)
+    (entry[0] if entry else _print_help)()
 
 if __name__ == '__main__':
-    # 运行模式选择
-    import sys
-    
-    if len(sys.argv) > 1:
-        mode = sys.argv[1].lower()
-        if mode == 'test':
-            run_test_mode()
-        elif mode == 'tui':
-            run_tui_mode()
-        elif mode == 'gui':
-            run_gui_mode()
-        else:
-            print("使用方式:")
-            print("python file_stats_agent.py test  # 测试模式")
-            print("python file_stats_agent.py tui   # 终端模式")
-            print("python file_stats_agent.py gui   # Web界面模式")
-            print("python file_stats_agent.py       # 默认Web界面模式")
-    else:
-        # 默认启动Web界面
-        run_gui_mode()
\ No newline at end of file
+    main()
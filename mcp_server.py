@@ -4,12 +4,410 @@ import shutil
 import os
 import json
 import asyncio
+import functools
+import hashlib
+import heapq
+import mmap
 import re
-from datetime import datetime
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from stat import S_ISDIR, S_ISREG
+from typing import Callable, Dict, Iterator, List, Any, Optional
+
+try:
+    # 可选依赖：xxHash（XXH3）借助 SIMD 指令，哈希速度远高于 BLAKE2b
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    # 可选依赖：BLAKE3，SIMD 与多线程实现的强哈希，用于最终确认重复文件
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
 
 mcp = FastMCP("Universal File Counter")
 
+# 重复文件检测：每次读取的块大小与并行哈希的线程数
+_HASH_CHUNK_SIZE = 1 << 20
+# 小于该大小的文件一次读入，不小于该大小的文件通过 mmap 整体哈希
+_HASH_SMALL_FILE = 64 * 1024
+_HASH_MMAP_MIN = 16 * 1024 * 1024
+# 预筛选时读取的文件头长度：大小相同但文件头不同的文件无需完整哈希
+_HASH_HEAD_SIZE = 4096
+_HASH_WORKERS = (os.cpu_count() or 1) * 2
+# 进程内同时打开用于哈希的文件数上限（多个并发的 find_duplicate_files 共享）
+_HASH_SLOTS = threading.BoundedSemaphore(_HASH_WORKERS)
+# 文件摘要缓存：{(摘要种类, 文件路径): ((大小, mtime_ns, inode), 摘要)}，按最近使用淘汰；
+# 文件未变化时重复查重直接复用之前计算的摘要，不再读取文件内容
+_DIGEST_CACHE: "OrderedDict[tuple[str, str], tuple[tuple[int, int, int], Any]]" = OrderedDict()
+_DIGEST_CACHE_MAX = 65536
+_DIGEST_LOCK = threading.Lock()
+
+# 文件大小单位，下标 i 对应 1024**i 字节
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+_UNIT_DIVISORS = {name: 1 << (10 * i) for i, name in enumerate(_SIZE_UNITS)}
+
+# 目录扫描结果缓存：{(目录, 是否递归): (过期时间, [文件的 os.DirEntry], {小写后缀: [os.DirEntry]})}
+# 后缀索引在扫描时顺带建立，按扩展名过滤或分类时直接取对应分组，不必遍历整个快照
+# DirEntry 会缓存自身的 stat 结果：只需路径/文件名的工具不触发 stat，需要大小或时间的
+# 工具首次访问时 stat 一次，之后复用同一快照的工具不再重复 stat
+# 同一目录在短时间内被多个工具连续查询时复用，写操作会清除相关条目；
+# 批量调用前可用 snapshot_directory 以更长的有效期预先扫描
+# 查找与写入时都会清理过期条目，所有快照的 DirEntry 总数超过上限时按最近使用淘汰
+_SCAN_CACHE: "OrderedDict[tuple[str, bool], tuple[float, list[os.DirEntry], dict[str, list[os.DirEntry]]]]" = OrderedDict()
+_SCAN_CACHE_MAX_ENTRIES = 200_000
+# 工具在线程池中并发执行，读写缓存时加锁（扫描本身在锁外进行）
+_SCAN_LOCK = threading.Lock()
+_SCAN_TTL = 2.0
+
+# 文件名中不允许出现的字符
+_ILLEGAL_NAME_CHARS = re.compile(r'[/\\:*?"<>|]')
+
+def _iter_files(root: str, recursive: bool = False) -> Iterator[os.DirEntry]:
+    """遍历目录中的文件（基于os.scandir）
+    
+    文件类型直接取自 DirEntry 缓存的目录项信息，普通文件不额外调用 stat；
+    指向文件的符号链接照常计入，但递归时不进入符号链接目录。
+    起始目录无法打开时抛出 OSError，其下无法访问的子目录和文件会被跳过。
+    
+    根据 recursive 选用专门的遍历生成器，内层循环不再逐项判断是否递归。
+    
+    Args:
+        root: 起始目录路径
+        recursive: 是否递归子目录
+    
+    Yields:
+        文件对应的 os.DirEntry
+    
+    Raises:
+        OSError: 起始目录不存在、不是目录或无权限
+    """
+    return _walk_files(root) if recursive else _list_dir_files(root)
+
+def _list_dir_files(root: str) -> Iterator[os.DirEntry]:
+    """_iter_files 的非递归版本：只列出起始目录下的文件"""
+    with os.scandir(root) as entries:
+        try:
+            for entry in entries:
+                try:
+                    # 指向目录的符号链接 is_file() 为 False，无需再单独判断目录
+                    if entry.is_file():
+                        yield entry
+                except OSError:
+                    continue
+        except OSError:
+            return
+
+def _walk_files(root: str) -> Iterator[os.DirEntry]:
+    """_iter_files 的递归版本：以栈深度优先遍历起始目录下的所有文件"""
+    pending = [root]
+    
+    while pending:
+        path = pending.pop()
+        try:
+            entries = os.scandir(path)
+        except OSError:
+            # 只把起始目录的错误交给调用方，调用方据此省去单独的 exists() 检查
+            if path is root:
+                raise
+            continue
+        
+        try:
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file():
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+def _scan(
+    root: str,
+    recursive: bool = False,
+    ttl: float = _SCAN_TTL
+) -> tuple[list[os.DirEntry], dict[str, list[os.DirEntry]]]:
+    """扫描目录并缓存结果，缓存未过期时重复扫描同一目录直接返回缓存
+    
+    Args:
+        root: 已解析的绝对目录路径
+        recursive: 是否递归子目录
+        ttl: 新扫描结果的缓存有效期（秒）
+    
+    Returns:
+        (文件的 os.DirEntry 列表, 按小写后缀分组的索引)，扫描时不做 stat；
+        索引的键与 _suffix 一致，无后缀文件的键为空字符串
+    
+    Raises:
+        OSError: 起始目录无法打开（失败结果不会被缓存）
+    """
+    cached = _cached_scan(root, recursive)
+    if cached is not None:
+        return cached
+    
+    now = time.monotonic()
+    entries = list(_iter_files(root, recursive))
+    by_suffix = {}
+    for entry in entries:
+        by_suffix.setdefault(_suffix(entry.name), []).append(entry)
+    
+    with _SCAN_LOCK:
+        key = (root, recursive)
+        _SCAN_CACHE[key] = (now + ttl, entries, by_suffix)
+        _SCAN_CACHE.move_to_end(key)
+        _evict_scan_cache(now)
+    return entries, by_suffix
+
+def _evict_scan_cache(now: float) -> None:
+    """清理过期快照，并按最近使用淘汰直到 DirEntry 总数不超过上限（调用方需持有 _SCAN_LOCK）
+    
+    最近使用的一个快照总会保留，即使它本身已超过上限。
+    """
+    for key in [key for key, (expires_at, _, _) in _SCAN_CACHE.items() if expires_at <= now]:
+        del _SCAN_CACHE[key]
+    
+    total = sum(len(entries) for _, entries, _ in _SCAN_CACHE.values())
+    while total > _SCAN_CACHE_MAX_ENTRIES and len(_SCAN_CACHE) > 1:
+        _, (_, entries, _) = _SCAN_CACHE.popitem(last=False)
+        total -= len(entries)
+
+def _cached_scan(
+    root: str,
+    recursive: bool
+) -> Optional[tuple[list[os.DirEntry], dict[str, list[os.DirEntry]]]]:
+    """返回未过期的缓存扫描结果（与 _scan 返回值相同），没有时返回 None，不触发扫描"""
+    key = (root, recursive)
+    with _SCAN_LOCK:
+        _evict_scan_cache(time.monotonic())
+        cached = _SCAN_CACHE.get(key)
+        if cached is None:
+            return None
+        _SCAN_CACHE.move_to_end(key)
+    return cached[1], cached[2]
+
+def _invalidate_scan_cache(*paths: str) -> None:
+    """清除与给定路径相关的扫描缓存（缓存目录是其祖先、自身或子目录）"""
+    with _SCAN_LOCK:
+        for key in list(_SCAN_CACHE):
+            root = key[0]
+            root_prefix = os.path.join(root, "")
+            for path in paths:
+                if path == root or path.startswith(root_prefix) or root.startswith(os.path.join(path, "")):
+                    del _SCAN_CACHE[key]
+                    break
+
+def _cached_digest(kind: str, hash_func: Callable, file_path: str, stat: os.stat_result) -> Any:
+    """计算文件摘要，文件大小、mtime 与 inode 均未变化时直接返回缓存的结果
+    
+    Args:
+        kind: 摘要种类（如 "head"、"full"），不同种类分别缓存
+        hash_func: hash_func(路径, 大小)，读取失败时返回 None（失败结果不缓存）
+        file_path: 文件路径
+        stat: 文件的 stat 结果
+    """
+    key = (kind, file_path)
+    signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    with _DIGEST_LOCK:
+        cached = _DIGEST_CACHE.get(key)
+        if cached is not None and cached[0] == signature:
+            _DIGEST_CACHE.move_to_end(key)
+            return cached[1]
+    
+    digest = hash_func(file_path, stat.st_size)
+    if digest is not None:
+        with _DIGEST_LOCK:
+            _DIGEST_CACHE[key] = (signature, digest)
+            _DIGEST_CACHE.move_to_end(key)
+            if len(_DIGEST_CACHE) > _DIGEST_CACHE_MAX:
+                _DIGEST_CACHE.popitem(last=False)
+    return digest
+
+def _advise_sequential(f) -> None:
+    """提示内核将顺序读取整个文件（加大预读），不支持的平台上忽略"""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+def _resolve_dir(directory: str) -> str:
+    """展开 ~ 并解析为绝对路径字符串；之后扫描得到的 entry.path 均为绝对路径，无需逐个 absolute()"""
+    return os.path.realpath(os.path.expanduser(directory))
+
+def _iter_entries(
+    root: str,
+    recursive: bool = False,
+    extension: Optional[str] = None
+) -> Iterator[os.DirEntry]:
+    """从（缓存的）目录扫描结果中产出文件的 os.DirEntry，不触发 stat
+    
+    扫描在调用时立即进行，起始目录无法打开时在此处抛出 OSError，
+    调用方只需把这一次调用包在 try 中。
+    
+    Args:
+        root: 已解析的绝对目录路径
+        recursive: 是否递归子目录
+        extension: 文件扩展名（不区分大小写），None表示所有文件
+    """
+    entries, by_suffix = _scan(root, recursive)
+    suffix = _extension_suffix(extension)
+    if suffix is None:
+        return iter(entries)
+    
+    if "." in suffix[1:]:
+        # 多段扩展名（如 tar.gz）不在索引中，按文件名结尾逐个匹配
+        matches = _suffix_matcher(suffix)
+        return (entry for entry in entries if matches(entry.name))
+    
+    # 单段扩展名直接取索引分组；文件名恰好等于后缀的点文件（如 ".pdf"）在无后缀分组中
+    matched = by_suffix.get(suffix, [])
+    dotfiles = [entry for entry in by_suffix.get("", ()) if entry.name.lower() == suffix]
+    return iter(matched + dotfiles if dotfiles else matched)
+
+def _iter_files_with_stat(
+    root: str,
+    recursive: bool = False,
+    extension: Optional[str] = None
+) -> Iterator[tuple[str, os.stat_result]]:
+    """与 _iter_entries 相同，但产出 (文件路径, stat结果)，无法 stat 的文件会被跳过"""
+    return _with_stat(_iter_entries(root, recursive, extension))
+
+def _with_stat(entries: Iterator[os.DirEntry]) -> Iterator[tuple[str, os.stat_result]]:
+    """为 DirEntry 取 stat（首次调用后缓存在 DirEntry 上），跳过无法 stat 的文件"""
+    for entry in entries:
+        try:
+            yield entry.path, entry.stat()
+        except OSError:
+            continue
+
+@functools.lru_cache(maxsize=256)
+def _extension_suffix(extension: Optional[str]) -> Optional[str]:
+    """把用户传入的扩展名（如 "pdf"、".PDF"、"*.pdf"）规范为 ".pdf"，空值返回None"""
+    if not extension:
+        return None
+    extension = extension.strip().lstrip("*").lstrip(".").lower()
+    return f".{extension}" if extension else None
+
+@functools.lru_cache(maxsize=256)
+def _suffix_matcher(suffix: str) -> Callable[[str], bool]:
+    """返回判断文件名是否以 suffix（已小写）结尾、不区分大小写的函数
+    
+    ASCII 后缀预先展开全部大小写组合交给 str.endswith，逐个文件名比较时
+    不再切片和 lower()；非 ASCII 文件名或字母过多的后缀仍走 lower() 比较。
+    """
+    suffix_len = len(suffix)
+    
+    def lower_matches(name: str) -> bool:
+        return name[-suffix_len:].lower() == suffix
+    
+    if not suffix.isascii() or sum(c.isalpha() for c in suffix) > 6:
+        return lower_matches
+    
+    variants = [""]
+    for char in suffix:
+        variants = [v + c for v in variants for c in {char, char.upper()}]
+    variants = tuple(variants)
+    
+    def matches(name: str) -> bool:
+        return name.endswith(variants) if name.isascii() else lower_matches(name)
+    return matches
+
+@functools.lru_cache(maxsize=8192)
+def _format_timestamp(seconds: int) -> str:
+    """把整秒时间戳格式化为本地时间字符串，同一秒内的文件共享一次格式化结果"""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds))
+
+def _local_day_ordinal_finder(start: float, end: float) -> Callable[[float], int]:
+    """返回把时间戳映射为本地日期序号（date.toordinal）的函数
+    
+    预先用 mktime 算出 [start, end] 覆盖的每个本地零点，落在范围内的时间戳
+    只需一次二分查找，不再逐个 localtime；范围外的时间戳回退到 localtime。
+    """
+    try:
+        first = date.fromtimestamp(start).toordinal()
+        last = date.fromtimestamp(end).toordinal() + 1
+        midnights = [time.mktime(date.fromordinal(day).timetuple()) for day in range(first, last + 1)]
+    except (OverflowError, ValueError, OSError):
+        first, midnights = 0, []
+    
+    def day_ordinal(timestamp: float) -> int:
+        index = bisect_right(midnights, timestamp) - 1
+        if 0 <= index < len(midnights) - 1:
+            return first + index
+        local_time = time.localtime(timestamp)
+        return date(local_time.tm_year, local_time.tm_mon, local_time.tm_mday).toordinal()
+    
+    return day_ordinal
+
+def _recent_file_info(full_path: str, stat: os.stat_result, prefix_len: int) -> dict[str, any]:
+    """构建 get_recent_files / get_file_timeline 返回的单个文件信息"""
+    directory, _, filename = full_path.rpartition(os.sep)
+    return {
+        "filename": filename,
+        "full_path": full_path,
+        "relative_path": full_path[prefix_len:],
+        "size_bytes": stat.st_size,
+        "size_formatted": _format_size_cached(stat.st_size),
+        "modified_time": _format_timestamp(int(stat.st_mtime)),
+        "modified_timestamp": stat.st_mtime,
+        "extension": _suffix(filename),
+        "directory": directory or os.sep
+    }
+
+def _suffix(name: str) -> str:
+    """返回小写的文件后缀（与 Path.suffix 规则一致），无后缀时返回空字符串"""
+    index = name.rfind('.')
+    return _canonical_suffix(name[index:]) if 0 < index < len(name) - 1 else ""
+
+@functools.lru_cache(maxsize=1024)
+def _canonical_suffix(suffix: str) -> str:
+    """小写化后缀；实际出现的后缀种类很少，缓存后同一后缀共享一个字符串对象"""
+    return suffix.lower()
+
+def _parse_date(text: str) -> tuple[int, int, int]:
+    """解析 YYYY-MM-DD 日期，返回 (年, 月, 日)，格式或日期非法时抛出 ValueError
+    
+    标准的补零格式直接切片解析，避开 strptime 的正则与区域设置开销；
+    其他写法（如 2024-1-5）回退到 strptime 以保持兼容。
+    """
+    if len(text) == 10 and text[4] == text[7] == "-" and (text[:4] + text[5:7] + text[8:]).isdigit():
+        year, month, day = int(text[:4]), int(text[5:7]), int(text[8:])
+    else:
+        parsed = datetime.strptime(text, "%Y-%m-%d")
+        year, month, day = parsed.year, parsed.month, parsed.day
+    # 借助 datetime 校验月份与日期范围（如 2024-02-30）
+    datetime(year, month, day)
+    return year, month, day
+
+def _count_files(directory: str, extension: Optional[str], recursive: bool) -> int:
+    """count_files 的同步实现（在线程池中执行）"""
+    root = _resolve_dir(directory)
+    if _cached_scan(root, recursive) is None:
+        # 没有现成快照时只需计数：边遍历边统计，不构建文件列表与后缀索引
+        suffix = _extension_suffix(extension)
+        try:
+            if suffix is None:
+                return sum(1 for _ in _iter_files(root, recursive))
+            matches = _suffix_matcher(suffix)
+            return sum(1 for entry in _iter_files(root, recursive) if matches(entry.name))
+        except OSError:
+            return 0
+    
+    try:
+        files = _iter_entries(root, recursive, extension)
+    except OSError:
+        return 0
+    
+    return sum(1 for _ in files)
+
 @mcp.tool()
 async def count_files(
     directory: str = "~/Desktop", 
@@ -31,22 +429,34 @@ async def count_files(
         count_files("~/Documents", "pdf")  # 统计Documents目录PDF文件
         count_files("~/Downloads", "jpg", True)  # 递归统计下载目录JPG文件
     """
-    target_dir = Path(directory).expanduser()
-    if not target_dir.exists():
-        return 0
-    
-    if extension:
-        pattern = f"**/*.{extension}" if recursive else f"*.{extension}"
-    else:
-        pattern = "**/*" if recursive else "*"
+    return await asyncio.to_thread(_count_files, directory, extension, recursive)
+
+def _list_files(
+    directory: str,
+    extension: Optional[str],
+    recursive: bool,
+    max_results: Optional[int]
+) -> list[str]:
+    """list_files 的同步实现（在线程池中执行）"""
+    root = _resolve_dir(directory)
+    try:
+        files = _iter_entries(root, recursive, extension)
+    except OSError:
+        return []
     
-    return len([f for f in target_dir.glob(pattern) if f.is_file()])
+    prefix_len = len(os.path.join(root, ""))
+    paths = (entry.path[prefix_len:] for entry in files)
+    if max_results is not None:
+        # 只需要排序后的前N个：有界堆取最小的N个，不对全部路径排序
+        return heapq.nsmallest(max(max_results, 0), paths)
+    return sorted(paths)
 
 @mcp.tool()
 async def list_files(
     directory: str = "~/Desktop",
     extension: str = None,
-    recursive: bool = False
+    recursive: bool = False,
+    max_results: int = None
 ) -> list[str]:
     """列出指定目录中的所有文件（支持任意文件类型）
     
@@ -54,25 +464,33 @@ async def list_files(
         directory: 目标目录路径，支持用户目录简写
         extension: 文件扩展名，None表示所有文件
         recursive: 是否递归子目录，默认False
+        max_results: 最多返回的路径数（按排序取前N个），None表示全部返回
     
     Returns:
-        相对路径列表
+        按字母排序的相对路径列表
     
     Examples:
         list_files()  # 列出桌面所有文件
         list_files("~/Documents", "pdf")  # 列出Documents目录PDF文件
+        list_files("~/Desktop", "png", max_results=3)  # 只取排序后的前3个PNG文件
     """
-    target_dir = Path(directory).expanduser()
-    if not target_dir.exists():
-        return []
-    
-    if extension:
-        pattern = f"**/*.{extension}" if recursive else f"*.{extension}"
-    else:
-        pattern = "**/*" if recursive else "*"
+    return await asyncio.to_thread(_list_files, directory, extension, recursive, max_results)
+
+def _categorize_files_by_extension(directory: str, recursive: bool) -> dict[str, list[str]]:
+    """categorize_files_by_extension 的同步实现（在线程池中执行）"""
+    try:
+        _, by_suffix = _scan(_resolve_dir(directory), recursive)
+    except OSError:
+        return {}
     
-    files = [f.relative_to(target_dir) for f in target_dir.glob(pattern) if f.is_file()]
-    return [str(f) for f in sorted(files)]
+    # 直接使用扫描时建立的后缀索引，无后缀文件归入 no_extension；
+    # 桶内按路径排序，各分类按其首个路径的顺序排列
+    buckets = [
+        (suffix or "no_extension", sorted(entry.path for entry in entries))
+        for suffix, entries in by_suffix.items()
+    ]
+    buckets.sort(key=lambda bucket: bucket[1][0])
+    return dict(buckets)
 
 @mcp.tool()
 async def categorize_files_by_extension(
@@ -92,32 +510,7 @@ async def categorize_files_by_extension(
         categorize_files_by_extension()  # 桌面文件按后缀分类
         categorize_files_by_extension("~/Documents", True)  # 递归分类Documents目录
     """
-    target_dir = Path(directory).expanduser()
-    if not target_dir.exists():
-        return {}
-    
-    pattern = "**/*" if recursive else "*"
-    
-    # 收集所有文件并按后缀分类
-    categorized = {}
-    for file_path in target_dir.glob(pattern):
-        if file_path.is_file():
-            suffix = file_path.suffix.lower()  # 获取文件后缀（小写）
-            if not suffix:  # 无后缀文件
-                suffix = "no_extension"
-            
-            # 使用完整绝对路径
-            full_path = str(file_path.absolute())
-            
-            if suffix not in categorized:
-                categorized[suffix] = []
-            categorized[suffix].append(full_path)
-    
-    # 对每个分类的文件按名称排序
-    for suffix in categorized:
-        categorized[suffix].sort()
-    
-    return categorized
+    return await asyncio.to_thread(_categorize_files_by_extension, directory, recursive)
 
 @mcp.tool()
 def format_file_size(size_bytes: int) -> str:
@@ -129,18 +522,53 @@ def format_file_size(size_bytes: int) -> str:
     Returns:
         格式化后的字符串（如：1.5 GB、256.3 MB）
     """
+    return _format_size_cached(size_bytes)
+
+@functools.lru_cache(maxsize=4096)
+def _format_size_cached(size_bytes: int) -> str:
+    """format_file_size 的实现（供内部调用，结果按字节数缓存）
+    
+    单位由 bit_length 直接算出（每 10 位对应一级 1024）。
+    """
     if size_bytes == 0:
         return "0 B"
     
-    units = ["B", "KB", "MB", "GB", "TB"]
-    size = float(size_bytes)
-    unit_index = 0
+    unit_index = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (unit_index * 10)):.1f} {_SIZE_UNITS[unit_index]}"
+
+def _get_directory_size(directory: str, unit: str, recursive: bool) -> dict[str, any]:
+    """get_directory_size 的同步实现（在线程池中执行）"""
+    try:
+        files = _iter_files_with_stat(_resolve_dir(directory), recursive)
+    except OSError:
+        return {"total_size": 0, "total_files": 0, "average_size": 0, "unit": unit}
+    
+    # 每个文件只 stat 一次（结果缓存在快照的 DirEntry 上），这里直接汇总 st_size
+    total_size = 0
+    total_files = 0
+    for _, stat in files:
+        total_size += stat.st_size
+        total_files += 1
+    
+    average_size = total_size / total_files if total_files > 0 else 0
     
-    while size >= 1024 and unit_index < len(units) - 1:
-        size /= 1024
-        unit_index += 1
+    # 根据单位格式化结果
+    divisor = _UNIT_DIVISORS.get(unit)
+    if divisor is not None:
+        formatted_total = f"{total_size / divisor:.1f} {unit}"
+        formatted_avg = f"{average_size / divisor:.1f} {unit}"
+    else:
+        formatted_total = _format_size_cached(total_size)
+        formatted_avg = _format_size_cached(int(average_size))
     
-    return f"{size:.1f} {units[unit_index]}"
+    return {
+        "total_size_bytes": total_size,
+        "total_files": total_files,
+        "average_size_bytes": int(average_size),
+        "formatted_total": formatted_total,
+        "formatted_average": formatted_avg,
+        "unit": unit
+    }
 
 @mcp.tool()
 async def get_directory_size(
@@ -163,53 +591,52 @@ async def get_directory_size(
         get_directory_size("~/Documents", "MB")  # Documents大小（MB）
         get_directory_size("~/Downloads", "GB", True)  # 递归统计下载目录（GB）
     """
-    target_dir = Path(directory).expanduser()
-    if not target_dir.exists():
-        return {"total_size": 0, "total_files": 0, "average_size": 0, "unit": unit}
-    
-    pattern = "**/*" if recursive else "*"
-    
-    total_size = 0
-    total_files = 0
+    return await asyncio.to_thread(_get_directory_size, directory, unit, recursive)
+
+def _find_large_files(
+    directory: str,
+    min_size_mb: float,
+    recursive: bool,
+    limit: int
+) -> list[dict[str, any]]:
+    """find_large_files 的同步实现（在线程池中执行）"""
+    # 根目录只解析一次，扫描结果中的路径即为绝对路径，相对路径直接切片得到
+    root = _resolve_dir(directory)
+    try:
+        files = _iter_files_with_stat(root, recursive)
+    except OSError:
+        return []
     
-    for file_path in target_dir.glob(pattern):
-        if file_path.is_file():
-            try:
-                total_size += file_path.stat().st_size
-                total_files += 1
-            except (OSError, PermissionError):
-                # 跳过无法访问的文件
-                continue
+    min_size_bytes = int(min_size_mb * 1024 * 1024)
+    prefix_len = len(os.path.join(root, ""))
     
-    average_size = total_size / total_files if total_files > 0 else 0
+    candidates = (
+        (stat.st_size, full_path)
+        for full_path, stat in files
+        if stat.st_size >= min_size_bytes
+    )
     
-    # 根据单位格式化结果
-    if unit == "auto":
-        formatted_total = format_file_size(total_size)
-        formatted_avg = format_file_size(int(average_size))
-    else:
-        units = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4}
-        if unit in units:
-            formatted_total = f"{total_size / units[unit]:.1f} {unit}"
-            formatted_avg = f"{average_size / units[unit]:.1f} {unit}"
-        else:
-            formatted_total = format_file_size(total_size)
-            formatted_avg = format_file_size(int(average_size))
+    # 用有界堆取最大的 limit 个（已按大小降序），只为这些文件构建结果
+    large_files = []
+    for file_size, full_path in heapq.nlargest(max(limit, 0), candidates, key=lambda c: c[0]):
+        directory, _, filename = full_path.rpartition(os.sep)
+        large_files.append({
+            "filename": filename,
+            "size_bytes": file_size,
+            "size_formatted": _format_size_cached(file_size),
+            "full_path": full_path,
+            "relative_path": full_path[prefix_len:],
+            "directory": directory or os.sep
+        })
     
-    return {
-        "total_size_bytes": total_size,
-        "total_files": total_files,
-        "average_size_bytes": int(average_size),
-        "formatted_total": formatted_total,
-        "formatted_average": formatted_avg,
-        "unit": unit
-    }
+    return large_files
 
 @mcp.tool()
 async def find_large_files(
     directory: str = "~/Desktop",
     min_size_mb: float = 100,
-    recursive: bool = False
+    recursive: bool = False,
+    limit: int = 100
 ) -> list[dict[str, any]]:
     """查找大文件
     
@@ -217,276 +644,320 @@ async def find_large_files(
         directory: 目标目录路径
         min_size_mb: 最小文件大小（MB）
         recursive: 是否递归子目录
+        limit: 最多返回的文件数（按大小取前N个）
     
     Returns:
-        大文件列表，包含文件名、大小、路径信息
+        大文件列表，包含文件名、大小、路径信息，按大小降序排列
     
     Examples:
         find_large_files()  # 查找桌面超过100MB的文件
         find_large_files("~/Documents", 500)  # 查找超过500MB的文件
         find_large_files("~/Downloads", 1024, True)  # 递归查找超过1GB的文件
+        find_large_files("~/Downloads", 10, True, 10)  # 递归查找最大的10个超过10MB的文件
     """
-    target_dir = Path(directory).expanduser()
-    if not target_dir.exists():
-        return []
-    
-    min_size_bytes = int(min_size_mb * 1024 * 1024)
-    pattern = "**/*" if recursive else "*"
-    
-    large_files = []
-    
-    for file_path in target_dir.glob(pattern):
-        if file_path.is_file():
-            try:
-                file_size = file_path.stat().st_size
-                if file_size >= min_size_bytes:
-                    large_files.append({
-                        "filename": file_path.name,
-                        "size_bytes": file_size,
-                        "size_formatted": format_file_size(file_size),
-                        "full_path": str(file_path.absolute()),
-                        "relative_path": str(file_path.relative_to(target_dir)),
-                        "directory": str(file_path.parent)
-                    })
-            except (OSError, PermissionError):
-                continue
-    
-    # 按文件大小降序排序
-    large_files.sort(key=lambda x: x["size_bytes"], reverse=True)
-    
-    return large_files
+    return await asyncio.to_thread(_find_large_files, directory, min_size_mb, recursive, limit)
 
-@mcp.tool()
-async def find_empty_folders(directory: str = "~/Desktop", recursive: bool = False) -> list[str]:
-    """查找空文件夹
-    
-    Args:
-        directory: 要检查的目录路径，支持~简写
-        recursive: 是否递归检查子目录
-    
-    Returns:
-        空文件夹路径列表
-    """
+def _find_empty_folders(directory: str, recursive: bool) -> list[str]:
+    """find_empty_folders 的同步实现（在线程池中执行）"""
     base_path = Path(directory).expanduser()
-    if not base_path.exists():
-        return []
-    
     empty_folders = []
     
+    # 目录不存在时 os.walk 不产出任何结果、os.scandir 直接抛错，均返回空列表
     if recursive:
-        # 递归检查所有子目录
+        # 递归检查所有子目录，os.walk 已列出每个目录的内容，无需再次读取
         for folder_path, subdirs, files in os.walk(base_path):
-            folder = Path(folder_path)
-            try:
-                # 检查文件夹是否为空（不包含文件和子文件夹）
-                if not any(folder.iterdir()):
-                    empty_folders.append(str(folder))
-            except (PermissionError, OSError):
-                continue
+            if not subdirs and not files:
+                empty_folders.append(folder_path)
     else:
-        # 只检查指定目录的直接子目录
+        # 只检查指定目录的直接子目录，读到第一个目录项即可判定非空
         try:
-            for item in base_path.iterdir():
-                if item.is_dir() and not any(item.iterdir()):
-                    empty_folders.append(str(item))
+            with os.scandir(base_path) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_dir():
+                            continue
+                        with os.scandir(entry.path) as sub_entries:
+                            if next(sub_entries, None) is None:
+                                empty_folders.append(entry.path)
+                    except (PermissionError, OSError):
+                        continue
         except (PermissionError, OSError):
             pass
     
     return empty_folders
 
 @mcp.tool()
-async def find_duplicate_files(directory: str = "~/Desktop", recursive: bool = False) -> dict[str, list[str]]:
-    """查找重复文件（基于文件内容哈希值）
+async def find_empty_folders(directory: str = "~/Desktop", recursive: bool = False) -> list[str]:
+    """查找空文件夹
     
     Args:
         directory: 要检查的目录路径，支持~简写
         recursive: 是否递归检查子目录
     
     Returns:
-        重复文件字典：{哈希值: [文件路径列表]}
+        空文件夹路径列表
     """
-    import hashlib
-    
-    base_path = Path(directory).expanduser()
-    if not base_path.exists():
+    return await asyncio.to_thread(_find_empty_folders, directory, recursive)
+
+def _find_duplicate_files(directory: str, recursive: bool, size_only: bool) -> dict[str, list[str]]:
+    """find_duplicate_files 的同步实现（在线程池中执行）"""
+    try:
+        files = _iter_files_with_stat(_resolve_dir(directory), recursive)
+    except OSError:
         return {}
     
+    # 按文件大小分组，大小唯一的文件不可能与其他文件重复
+    size_groups = {}
+    for item in files:
+        size_groups.setdefault(item[1].st_size, []).append(item)
+    
+    if size_only:
+        # 只按大小判断，不读取任何文件内容
+        return {
+            f"size_{size}": [path for path, _ in items]
+            for size, items in size_groups.items()
+            if len(items) > 1
+        }
+    
+    # 空文件内容必然相同，无需打开；其余大小相同的文件才进入哈希流程
+    empty_files = size_groups.pop(0, [])
+    candidates = [item for items in size_groups.values() if len(items) > 1 for item in items]
+    
+    # 只用于目录内查重、无安全需求，优先使用非加密的 XXH3，未安装时回退到 BLAKE2b
+    if xxhash is not None:
+        new_hasher = xxhash.xxh3_128
+    else:
+        def new_hasher():
+            return hashlib.blake2b(digest_size=16)
+    
     file_hashes = {}
+    if len(empty_files) > 1:
+        file_hashes[new_hasher().digest()] = [path for path, _ in empty_files]
     
-    def get_file_hash(file_path: Path) -> str:
-        """计算文件的MD5哈希值"""
+    # 各轮摘要均为16字节的原始 bytes（不转十六进制），只在返回结果时格式化
+    def get_head_hash(file_path: str, size: int) -> Optional[bytes]:
+        """计算文件头（前 _HASH_HEAD_SIZE 字节）的哈希值，文件不超过该长度时即为整个文件的哈希"""
         try:
-            hasher = hashlib.md5()
-            with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
+            with _HASH_SLOTS, open(file_path, 'rb') as f:
+                hasher = new_hasher()
+                hasher.update(f.read(_HASH_HEAD_SIZE))
+            return hasher.digest()
         except (IOError, OSError):
-            return ""
+            return None
     
-    if recursive:
-        # 递归查找所有文件
-        for folder_path, subdirs, files in os.walk(base_path):
-            folder = Path(folder_path)
-            for file_name in files:
-                file_path = folder / file_name
-                if file_path.is_file():
-                    file_hash = get_file_hash(file_path)
-                    if file_hash:
-                        if file_hash not in file_hashes:
-                            file_hashes[file_hash] = []
-                        file_hashes[file_hash].append(str(file_path))
-    else:
-        # 只查找指定目录的直接文件
+    def get_fast_hash(file_path: str, size: int) -> Optional[int]:
+        """计算整个文件的 XXH3-128 摘要（整数形式），作为 BLAKE3 之前的廉价筛选"""
         try:
-            for item in base_path.iterdir():
-                if item.is_file():
-                    file_hash = get_file_hash(item)
-                    if file_hash:
-                        if file_hash not in file_hashes:
-                            file_hashes[file_hash] = []
-                        file_hashes[file_hash].append(str(item))
-        except (PermissionError, OSError):
-            pass
+            with _HASH_SLOTS, open(file_path, 'rb') as f:
+                _advise_sequential(f)
+                if size >= _HASH_MMAP_MIN:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        return xxhash.xxh3_128_intdigest(mapped)
+                return xxhash.xxh3_128_intdigest(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+    
+    def get_file_hash(file_path: str, size: int) -> Optional[bytes]:
+        """计算文件的128位强哈希值（BLAKE3，未安装时用 XXH3 或 BLAKE2b），按文件大小选择读取方式"""
+        try:
+            if blake3 is not None and size >= _HASH_SMALL_FILE:
+                # 大文件才启用 BLAKE3 的内部多线程，避免与外层线程池争抢CPU
+                hasher = blake3(max_threads=blake3.AUTO if size >= _HASH_MMAP_MIN else 1)
+                with _HASH_SLOTS:
+                    hasher.update_mmap(file_path)
+                return hasher.digest(length=16)
+            
+            with _HASH_SLOTS, open(file_path, 'rb') as f:
+                if blake3 is not None:
+                    hasher = blake3()
+                    hasher.update(f.read())
+                    return hasher.digest(length=16)
+                if size < _HASH_SMALL_FILE:
+                    hasher = new_hasher()
+                    hasher.update(f.read())
+                    return hasher.digest()
+                
+                _advise_sequential(f)
+                if size >= _HASH_MMAP_MIN:
+                    # 直接对映射的页缓存做哈希，省去 Python 层的分块循环
+                    hasher = new_hasher()
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        hasher.update(mapped)
+                elif hasattr(hashlib, "file_digest"):  # Python 3.11+
+                    hasher = hashlib.file_digest(f, new_hasher)
+                else:
+                    hasher = new_hasher()
+                    for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                        hasher.update(chunk)
+            return hasher.digest()
+        except (IOError, OSError, ValueError):
+            return None
+    
+    def hash_groups(kind: str, hash_func, items) -> dict:
+        """并行计算 items 中 (路径, stat结果) 的哈希（复用未变化文件的缓存），
+        按 (大小, 哈希值) 分组，读取失败的文件被丢弃"""
+        groups = {}
+        if items:
+            def digest(item):
+                return _cached_digest(kind, hash_func, *item)
+            
+            with ThreadPoolExecutor(max_workers=_HASH_WORKERS) as executor:
+                for item, file_hash in zip(items, executor.map(digest, items)):
+                    if file_hash is not None:
+                        groups.setdefault((item[1].st_size, file_hash), []).append(item)
+        return groups
+    
+    # 第一轮只读文件头；不超过文件头长度的文件此时已读完，分组即为最终结果
+    full_candidates = []
+    for (size, head_hash), items in hash_groups("head", get_head_hash, candidates).items():
+        if len(items) < 2:
+            continue
+        if size <= _HASH_HEAD_SIZE:
+            file_hashes.setdefault(head_hash, []).extend(path for path, _ in items)
+        else:
+            full_candidates.extend(items)
+    
+    # 同时安装 xxhash 与 blake3 时先用 XXH3 完整哈希筛选，只有 XXH3 也相同的文件才交给 BLAKE3 确认
+    if xxhash is not None and blake3 is not None:
+        full_candidates = [
+            item
+            for items in hash_groups("fast", get_fast_hash, full_candidates).values()
+            if len(items) > 1
+            for item in items
+        ]
+    
+    # 最后一轮：文件头（及 XXH3）也相同的文件才做完整的强哈希
+    for (_, file_hash), items in hash_groups("full", get_file_hash, full_candidates).items():
+        file_hashes.setdefault(file_hash, []).extend(path for path, _ in items)
     
     # 只返回重复的文件（哈希值对应多个文件）
-    duplicate_files = {hash_val: paths for hash_val, paths in file_hashes.items() 
+    duplicate_files = {hash_val.hex(): paths for hash_val, paths in file_hashes.items() 
                       if len(paths) > 1}
     
     return duplicate_files
 
 @mcp.tool()
-async def get_recent_files(
+async def find_duplicate_files(
     directory: str = "~/Desktop",
-    days: int = 7,
-    extension: str = None,
-    recursive: bool = False
-) -> list[dict[str, any]]:
-    """获取最近修改的文件列表
+    recursive: bool = False,
+    size_only: bool = False
+) -> dict[str, list[str]]:
+    """查找重复文件（基于文件内容哈希值）
+    
+    先按文件大小分组，只有大小相同的文件才会读取内容计算哈希，
+    哈希计算在线程池中并行进行；空文件直接归为一组，不读取内容。
     
     Args:
-        directory: 目标目录路径
-        days: 最近天数（如7表示最近7天）
-        extension: 文件扩展名过滤，None表示所有文件
-        recursive: 是否递归子目录
+        directory: 要检查的目录路径，支持~简写
+        recursive: 是否递归检查子目录
+        size_only: 为True时只按文件大小分组、不读取文件内容（速度快，但大小相同不代表内容相同）
     
     Returns:
-        包含文件信息的列表，按修改时间降序排列
+        重复文件字典：{哈希值: [文件路径列表]}；size_only 时键为 "size_<字节数>"
     """
-    import time
-    from datetime import datetime, timedelta
-    
-    target_dir = Path(directory).expanduser()
-    if not target_dir.exists():
+    return await asyncio.to_thread(_find_duplicate_files, directory, recursive, size_only)
+
+def _get_recent_files(
+    directory: str,
+    days: int,
+    extension: Optional[str],
+    recursive: bool
+) -> list[dict[str, any]]:
+    """get_recent_files 的同步实现（在线程池中执行）"""
+    root = _resolve_dir(directory)
+    try:
+        files = _iter_files_with_stat(root, recursive, extension)
+    except OSError:
         return []
     
     # 计算时间阈值
     cutoff_time = datetime.now() - timedelta(days=days)
     cutoff_timestamp = cutoff_time.timestamp()
     
-    if extension:
-        pattern = f"**/*.{extension}" if recursive else f"*.{extension}"
-    else:
-        pattern = "**/*" if recursive else "*"
+    prefix_len = len(os.path.join(root, ""))
     
-    recent_files = []
-    
-    for file_path in target_dir.glob(pattern):
-        if file_path.is_file():
-            try:
-                stat = file_path.stat()
-                mod_time = stat.st_mtime
-                
-                if mod_time >= cutoff_timestamp:
-                    recent_files.append({
-                        "filename": file_path.name,
-                        "full_path": str(file_path.absolute()),
-                        "relative_path": str(file_path.relative_to(target_dir)),
-                        "size_bytes": stat.st_size,
-                        "size_formatted": format_file_size(stat.st_size),
-                        "modified_time": datetime.fromtimestamp(mod_time).strftime("%Y-%m-%d %H:%M:%S"),
-                        "modified_timestamp": mod_time,
-                        "extension": file_path.suffix.lower(),
-                        "directory": str(file_path.parent)
-                    })
-            except (OSError, PermissionError):
-                continue
+    recent_files = [
+        _recent_file_info(full_path, stat, prefix_len)
+        for full_path, stat in files
+        if stat.st_mtime >= cutoff_timestamp
+    ]
     
     # 按修改时间降序排序
     recent_files.sort(key=lambda x: x["modified_timestamp"], reverse=True)
     return recent_files
 
 @mcp.tool()
-async def get_files_by_date_range(
+async def get_recent_files(
     directory: str = "~/Desktop",
-    start_date: str = None,
-    end_date: str = None,
+    days: int = 7,
     extension: str = None,
     recursive: bool = False
-) -> dict[str, any]:
-    """按日期范围查询文件
+) -> list[dict[str, any]]:
+    """获取最近修改的文件列表
     
     Args:
         directory: 目标目录路径
-        start_date: 开始日期（格式：YYYY-MM-DD）
-        end_date: 结束日期（格式：YYYY-MM-DD）
-        extension: 文件扩展名过滤
+        days: 最近天数（如7表示最近7天）
+        extension: 文件扩展名过滤，None表示所有文件
         recursive: 是否递归子目录
     
     Returns:
-        包含文件列表和统计信息的字典
+        包含文件信息的列表，按修改时间降序排列
     """
-    import time
-    from datetime import datetime
-    
-    target_dir = Path(directory).expanduser()
-    if not target_dir.exists():
+    return await asyncio.to_thread(_get_recent_files, directory, days, extension, recursive)
+
+def _get_files_by_date_range(
+    directory: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    extension: Optional[str],
+    recursive: bool
+) -> dict[str, any]:
+    """get_files_by_date_range 的同步实现（在线程池中执行）"""
+    target_dir = str(Path(directory).expanduser())
+    root = _resolve_dir(target_dir)
+    try:
+        files = _iter_files_with_stat(root, recursive, extension)
+    except OSError:
         return {"files": [], "total_count": 0, "total_size": 0}
     
     # 解析日期范围
     try:
         if start_date:
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            start_timestamp = start_dt.replace(hour=0, minute=0, second=0).timestamp()
+            year, month, day = _parse_date(start_date)
+            start_timestamp = time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))
         else:
             start_timestamp = 0
             
         if end_date:
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-            end_timestamp = end_dt.replace(hour=23, minute=59, second=59).timestamp()
+            year, month, day = _parse_date(end_date)
+            end_timestamp = time.mktime((year, month, day, 23, 59, 59, 0, 0, -1))
         else:
-            end_timestamp = datetime.now().timestamp()
+            end_timestamp = time.time()
     except ValueError:
         return {"error": "日期格式错误，请使用YYYY-MM-DD格式", "files": [], "total_count": 0, "total_size": 0}
     
-    if extension:
-        pattern = f"**/*.{extension}" if recursive else f"*.{extension}"
-    else:
-        pattern = "**/*" if recursive else "*"
+    prefix_len = len(os.path.join(root, ""))
     
     files_in_range = []
     total_size = 0
     
-    for file_path in target_dir.glob(pattern):
-        if file_path.is_file():
-            try:
-                stat = file_path.stat()
-                mod_time = stat.st_mtime
-                
-                if start_timestamp <= mod_time <= end_timestamp:
-                    file_info = {
-                        "filename": file_path.name,
-                        "full_path": str(file_path.absolute()),
-                        "relative_path": str(file_path.relative_to(target_dir)),
-                        "size_bytes": stat.st_size,
-                        "size_formatted": format_file_size(stat.st_size),
-                        "modified_time": datetime.fromtimestamp(mod_time).strftime("%Y-%m-%d %H:%M:%S"),
-                        "extension": file_path.suffix.lower()
-                    }
-                    files_in_range.append(file_info)
-                    total_size += stat.st_size
-            except (OSError, PermissionError):
-                continue
+    for full_path, stat in files:
+        mod_time = stat.st_mtime
+        
+        if start_timestamp <= mod_time <= end_timestamp:
+            filename = full_path.rpartition(os.sep)[2]
+            file_info = {
+                "filename": filename,
+                "full_path": full_path,
+                "relative_path": full_path[prefix_len:],
+                "size_bytes": stat.st_size,
+                "size_formatted": _format_size_cached(stat.st_size),
+                "modified_time": _format_timestamp(int(mod_time)),
+                "extension": _suffix(filename)
+            }
+            files_in_range.append(file_info)
+            total_size += stat.st_size
     
     # 按修改时间排序
     files_in_range.sort(key=lambda x: x["modified_time"], reverse=True)
@@ -495,80 +966,112 @@ async def get_files_by_date_range(
         "files": files_in_range,
         "total_count": len(files_in_range),
         "total_size": total_size,
-        "total_size_formatted": format_file_size(total_size),
+        "total_size_formatted": _format_size_cached(total_size),
         "start_date": start_date or "不限",
         "end_date": end_date or "今天",
-        "directory": str(target_dir)
+        "directory": target_dir
     }
 
 @mcp.tool()
-async def get_file_timeline(
+async def get_files_by_date_range(
     directory: str = "~/Desktop",
-    days: int = 30,
-    group_by: str = "day",
+    start_date: str = None,
+    end_date: str = None,
+    extension: str = None,
     recursive: bool = False
 ) -> dict[str, any]:
-    """获取文件时间线视图
+    """按日期范围查询文件
     
     Args:
         directory: 目标目录路径
-        days: 查看最近多少天的文件
-        group_by: 分组方式（"day", "week", "month"）
+        start_date: 开始日期（格式：YYYY-MM-DD）
+        end_date: 结束日期（格式：YYYY-MM-DD）
+        extension: 文件扩展名过滤
         recursive: 是否递归子目录
     
     Returns:
-        按时间分组的文件统计信息
+        包含文件列表和统计信息的字典
     """
-    import time
-    from datetime import datetime, timedelta
-    
-    target_dir = Path(directory).expanduser()
-    if not target_dir.exists():
+    return await asyncio.to_thread(_get_files_by_date_range, directory, start_date, end_date, extension, recursive)
+
+def _get_file_timeline(
+    directory: str,
+    days: int,
+    group_by: str,
+    recursive: bool,
+    include_files: bool
+) -> dict[str, any]:
+    """get_file_timeline 的同步实现（在线程池中执行）"""
+    target_dir = str(Path(directory).expanduser())
+    root = _resolve_dir(target_dir)
+    try:
+        files = _iter_files_with_stat(root, recursive)
+    except OSError:
         return {"timeline": {}, "summary": {}}
     
-    # 获取最近指定天数的文件
-    recent_files = await get_recent_files(directory, days, None, recursive)
+    now = datetime.now()
+    cutoff_timestamp = (now - timedelta(days=days)).timestamp()
+    prefix_len = len(os.path.join(root, ""))
     
-    timeline = {}
+    # 分组键使用整数：按天/按周为日序号（date.toordinal），按月为 年*12+月，
+    # 循环内只做整数运算与累加，日期字符串和格式化大小在循环结束后每组生成一次
+    if group_by != "month":
+        day_ordinal = _local_day_ordinal_finder(cutoff_timestamp, now.timestamp())
+    buckets = {}
+    total_files = 0
+    total_size = 0
     
-    for file_info in recent_files:
-        mod_time = datetime.fromtimestamp(file_info["modified_timestamp"])
-        
-        if group_by == "day":
-            key = mod_time.strftime("%Y-%m-%d")
-        elif group_by == "week":
-            # 获取周的开始日期（周一）
-            week_start = mod_time - timedelta(days=mod_time.weekday())
-            key = week_start.strftime("%Y-%m-%d")
-        elif group_by == "month":
-            key = mod_time.strftime("%Y-%m")
+    for full_path, stat in files:
+        mod_time = stat.st_mtime
+        if mod_time < cutoff_timestamp:
+            continue
+        
+        if group_by == "month":
+            local_time = time.localtime(mod_time)
+            key = local_time.tm_year * 12 + local_time.tm_mon - 1
         else:
-            key = mod_time.strftime("%Y-%m-%d")
-        
-        if key not in timeline:
-            timeline[key] = {
-                "files": [],
-                "count": 0,
-                "total_size": 0,
-                "total_size_formatted": "0 B"
-            }
+            key = day_ordinal(mod_time)
+            if group_by == "week":
+                # 归入所在周的周一（序号 1 即公元1年1月1日为周一）
+                key -= (key - 1) % 7
+        
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [0, 0, [] if include_files else None]
         
-        timeline[key]["files"].append(file_info)
-        timeline[key]["count"] += 1
-        timeline[key]["total_size"] += file_info["size_bytes"]
-        timeline[key]["total_size_formatted"] = format_file_size(timeline[key]["total_size"])
+        bucket[0] += 1
+        bucket[1] += stat.st_size
+        if include_files:
+            bucket[2].append(_recent_file_info(full_path, stat, prefix_len))
+        
+        total_files += 1
+        total_size += stat.st_size
     
-    # 计算统计摘要
-    total_files = len(recent_files)
-    total_size = sum(f["size_bytes"] for f in recent_files)
+    # 分组按时间倒序，组内文件按修改时间降序
+    timeline = {}
+    for key in sorted(buckets, reverse=True):
+        count, size, bucket_files = buckets[key]
+        if group_by == "month":
+            label = f"{key // 12:04d}-{key % 12 + 1:02d}"
+        else:
+            label = date.fromordinal(key).strftime("%Y-%m-%d")
+        entry = timeline[label] = {
+            "count": count,
+            "total_size": size,
+            "total_size_formatted": _format_size_cached(size)
+        }
+        if include_files:
+            bucket_files.sort(key=lambda x: x["modified_timestamp"], reverse=True)
+            entry["files"] = bucket_files
     
+    # 计算统计摘要
     summary = {
         "total_files": total_files,
         "total_size": total_size,
-        "total_size_formatted": format_file_size(total_size),
+        "total_size_formatted": _format_size_cached(total_size),
         "date_range": f"最近{days}天",
         "group_by": group_by,
-        "directory": str(target_dir)
+        "directory": target_dir
     }
     
     return {
@@ -576,26 +1079,41 @@ async def get_file_timeline(
         "summary": summary
     }
 
-
-
 @mcp.tool()
-async def rename_file(old_path: str, new_name: str) -> dict[str, any]:
-    """重命名文件或文件夹
+async def get_file_timeline(
+    directory: str = "~/Desktop",
+    days: int = 30,
+    group_by: str = "day",
+    recursive: bool = False,
+    include_files: bool = False
+) -> dict[str, any]:
+    """获取文件时间线视图
+    
+    单次遍历目录，直接由文件修改时间计算分组键并累计数量和大小。
     
     Args:
-        old_path: 原始文件或文件夹路径
-        new_name: 新的名称（不包含路径）
+        directory: 目标目录路径
+        days: 查看最近多少天的文件
+        group_by: 分组方式（"day", "week", "month"）
+        recursive: 是否递归子目录
+        include_files: 是否在每个分组中附带文件详情列表，默认False只返回统计
     
     Returns:
-        操作结果字典
+        按时间分组的文件统计信息
     """
+    return await asyncio.to_thread(_get_file_timeline, directory, days, group_by, recursive, include_files)
+
+
+
+def _rename_file(old_path: str, new_name: str) -> dict[str, any]:
+    """rename_file 的同步实现（在线程池中执行）"""
     try:
         old_path = Path(old_path).expanduser().resolve()
         if not old_path.exists():
             return {"success": False, "error": "文件或文件夹不存在"}
         
         # 验证新名称是否包含非法字符
-        if any(char in new_name for char in ['/', '\\', ':', '*', '?', '"', '<', '>', '|']):
+        if _ILLEGAL_NAME_CHARS.search(new_name):
             return {"success": False, "error": "文件名包含非法字符"}
         
         new_path = old_path.parent / new_name
@@ -606,6 +1124,7 @@ async def rename_file(old_path: str, new_name: str) -> dict[str, any]:
         
         # 执行重命名
         old_path.rename(new_path)
+        _invalidate_scan_cache(str(old_path), str(new_path))
         
         return {
             "success": True,
@@ -620,16 +1139,20 @@ async def rename_file(old_path: str, new_name: str) -> dict[str, any]:
         return {"success": False, "error": f"重命名失败: {str(e)}"}
 
 @mcp.tool()
-async def move_file(source_path: str, target_directory: str) -> dict[str, any]:
-    """移动文件或文件夹到指定目录
+async def rename_file(old_path: str, new_name: str) -> dict[str, any]:
+    """重命名文件或文件夹
     
     Args:
-        source_path: 源文件或文件夹路径
-        target_directory: 目标目录路径
+        old_path: 原始文件或文件夹路径
+        new_name: 新的名称（不包含路径）
     
     Returns:
         操作结果字典
     """
+    return await asyncio.to_thread(_rename_file, old_path, new_name)
+
+def _move_file(source_path: str, target_directory: str) -> dict[str, any]:
+    """move_file 的同步实现（在线程池中执行）"""
     try:
         source_path = Path(source_path).expanduser().resolve()
         target_directory = Path(target_directory).expanduser().resolve()
@@ -647,6 +1170,7 @@ async def move_file(source_path: str, target_directory: str) -> dict[str, any]:
         
         # 执行移动
         shutil.move(str(source_path), str(target_directory))
+        _invalidate_scan_cache(str(source_path), str(target_path))
         
         return {
             "success": True,
@@ -661,15 +1185,20 @@ async def move_file(source_path: str, target_directory: str) -> dict[str, any]:
         return {"success": False, "error": f"移动失败: {str(e)}"}
 
 @mcp.tool()
-async def get_file_info(file_path: str) -> dict[str, any]:
-    """获取文件或文件夹的详细信息
+async def move_file(source_path: str, target_directory: str) -> dict[str, any]:
+    """移动文件或文件夹到指定目录
     
     Args:
-        file_path: 文件或文件夹路径
+        source_path: 源文件或文件夹路径
+        target_directory: 目标目录路径
     
     Returns:
-        详细信息字典
+        操作结果字典
     """
+    return await asyncio.to_thread(_move_file, source_path, target_directory)
+
+def _get_file_info(file_path: str) -> dict[str, any]:
+    """get_file_info 的同步实现（在线程池中执行）"""
     try:
         path = Path(file_path).expanduser().resolve()
         
@@ -677,29 +1206,42 @@ async def get_file_info(file_path: str) -> dict[str, any]:
             return {"success": False, "error": "文件或文件夹不存在"}
         
         stat = path.stat()
+        # 文件类型直接取自已有的 stat 结果，不再分别调用 is_file()/is_dir()
+        is_file = S_ISREG(stat.st_mode)
         
         info = {
             "success": True,
             "name": path.name,
             "full_path": str(path),
             "parent_directory": str(path.parent),
-            "type": "file" if path.is_file() else "directory",
+            "type": "file" if is_file else "directory",
             "size_bytes": stat.st_size,
-            "size_formatted": format_file_size(stat.st_size),
+            "size_formatted": _format_size_cached(stat.st_size),
             "created_time": datetime.fromtimestamp(stat.st_ctime).strftime("%Y-%m-%d %H:%M:%S"),
             "modified_time": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
             "accessed_time": datetime.fromtimestamp(stat.st_atime).strftime("%Y-%m-%d %H:%M:%S"),
-            "extension": path.suffix.lower() if path.is_file() else None,
+            "extension": path.suffix.lower() if is_file else None,
             "is_hidden": path.name.startswith('.')
         }
         
         # 如果是目录，添加子项统计
-        if path.is_dir():
+        if S_ISDIR(stat.st_mode):
             try:
-                items = list(path.iterdir())
-                info["sub_items_count"] = len(items)
-                info["sub_files_count"] = len([i for i in items if i.is_file()])
-                info["sub_dirs_count"] = len([i for i in items if i.is_dir()])
+                # 单次遍历计数，类型信息来自 DirEntry 缓存，只有符号链接才需额外 stat
+                items_count = files_count = dirs_count = 0
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        items_count += 1
+                        try:
+                            if entry.is_file():
+                                files_count += 1
+                            elif entry.is_dir():
+                                dirs_count += 1
+                        except OSError:
+                            continue
+                info["sub_items_count"] = items_count
+                info["sub_files_count"] = files_count
+                info["sub_dirs_count"] = dirs_count
             except PermissionError:
                 info["sub_items_count"] = 0
                 info["sub_files_count"] = 0
@@ -711,27 +1253,19 @@ async def get_file_info(file_path: str) -> dict[str, any]:
         return {"success": False, "error": f"获取信息失败: {str(e)}"}
 
 @mcp.tool()
-async def delete_file(file_path: str, force: bool = False) -> dict[str, any]:
-    """删除文件或文件夹（支持递归删除）
-    
-    安全删除功能，提供多种保护机制：
-    1. 路径验证：确保路径存在且可访问
-    2. 权限检查：验证删除权限
-    3. 递归警告：删除非空目录时给出警告
-    4. 操作确认：重要操作需要确认
+async def get_file_info(file_path: str) -> dict[str, any]:
+    """获取文件或文件夹的详细信息
     
     Args:
-        file_path: 要删除的文件或文件夹路径
-        force: 强制删除模式，跳过非空目录警告（谨慎使用）
+        file_path: 文件或文件夹路径
     
     Returns:
-        操作结果字典，包含删除详情
-    
-    Examples:
-        delete_file("~/Desktop/test.txt")  # 删除单个文件
-        delete_file("~/Desktop/temp_folder")  # 删除空文件夹
-        delete_file("~/Desktop/old_project", force=True)  # 强制删除非空文件夹
+        详细信息字典
     """
+    return await asyncio.to_thread(_get_file_info, file_path)
+
+def _delete_file(file_path: str, force: bool, include_size: bool) -> dict[str, any]:
+    """delete_file 的同步实现（在线程池中执行）"""
     try:
         path = Path(file_path).expanduser().resolve()
         
@@ -742,24 +1276,7 @@ async def delete_file(file_path: str, force: bool = False) -> dict[str, any]:
                 "path": str(path)
             }
         
-        # 获取文件/文件夹信息用于返回
         is_directory = path.is_dir()
-        original_size = 0
-        item_count = 0
-        
-        if is_directory:
-            try:
-                # 计算目录大小和文件数量
-                for item in path.rglob("*"):
-                    if item.is_file():
-                        original_size += item.stat().st_size
-                        item_count += 1
-            except (OSError, PermissionError):
-                original_size = 0
-                item_count = 0
-        else:
-            original_size = path.stat().st_size
-            item_count = 1
         
         # 检查是否为系统关键目录（额外保护）
         critical_paths = ["/", "/System", "/Library", "/Applications", "/Users", str(Path.home())]
@@ -787,6 +1304,27 @@ async def delete_file(file_path: str, force: bool = False) -> dict[str, any]:
             except (OSError, PermissionError):
                 pass
         
+        # 获取文件/文件夹信息用于返回（通过安全检查后才统计）
+        original_size = 0
+        item_count = 0
+        
+        if not is_directory:
+            original_size = path.stat().st_size
+            item_count = 1
+        elif include_size or not force:
+            # 计算目录大小和文件数量（非强制删除时目录必为空，遍历开销可忽略）
+            for folder_path, subdirs, files in os.walk(path):
+                for name in files:
+                    try:
+                        original_size += os.stat(os.path.join(folder_path, name)).st_size
+                        item_count += 1
+                    except (OSError, PermissionError):
+                        continue
+        else:
+            # 强制删除整个目录且未要求统计时，跳过删除前的整树遍历
+            original_size = None
+            item_count = None
+        
         # 执行删除操作
         if is_directory:
             if force:
@@ -803,6 +1341,7 @@ async def delete_file(file_path: str, force: bool = False) -> dict[str, any]:
                     }
         else:
             path.unlink()
+        _invalidate_scan_cache(str(path))
         
         return {
             "success": True,
@@ -811,7 +1350,7 @@ async def delete_file(file_path: str, force: bool = False) -> dict[str, any]:
             "type": "directory" if is_directory else "file",
             "original_size": original_size,
             "item_count": item_count,
-            "space_freed": format_file_size(original_size)
+            "space_freed": _format_size_cached(original_size) if original_size is not None else None
         }
     
     except PermissionError:
@@ -835,21 +1374,64 @@ async def delete_file(file_path: str, force: bool = False) -> dict[str, any]:
         }
 
 @mcp.tool()
-async def safe_delete(file_path: str, backup: bool = False) -> dict[str, any]:
-    """安全删除文件（移动到回收站）
+async def delete_file(file_path: str, force: bool = False, include_size: bool = False) -> dict[str, any]:
+    """删除文件或文件夹（支持递归删除）
     
-    提供更安全的数据保护方案：
-    1. 支持移动到回收站（macOS）
-    2. 可选备份功能
-    3. 详细的操作记录
+    安全删除功能，提供多种保护机制：
+    1. 路径验证：确保路径存在且可访问
+    2. 权限检查：验证删除权限
+    3. 递归警告：删除非空目录时给出警告
+    4. 操作确认：重要操作需要确认
     
     Args:
         file_path: 要删除的文件或文件夹路径
-        backup: 是否创建备份
+        force: 强制删除模式，跳过非空目录警告（谨慎使用）
+        include_size: 强制删除目录时是否先统计释放的空间和文件数，
+            默认False跳过统计（对应字段返回None）
     
     Returns:
-        操作结果字典
+        操作结果字典，包含删除详情
+    
+    Examples:
+        delete_file("~/Desktop/test.txt")  # 删除单个文件
+        delete_file("~/Desktop/temp_folder")  # 删除空文件夹
+        delete_file("~/Desktop/old_project", force=True)  # 强制删除非空文件夹
+        delete_file("~/Desktop/old_project", force=True, include_size=True)  # 删除并统计释放空间
     """
+    return await asyncio.to_thread(_delete_file, file_path, force, include_size)
+
+def _same_device(path: str, directory: str) -> bool:
+    """判断路径与目标目录是否位于同一文件系统（可直接 rename / 硬链接）"""
+    try:
+        return os.stat(path).st_dev == os.stat(directory).st_dev
+    except OSError:
+        return False
+
+def _backup_item(source: str, backup_path: str, is_dir: bool, hardlink: bool) -> None:
+    """创建备份：同一文件系统时用硬链接，不复制文件数据；失败时回退为完整复制"""
+    if hardlink:
+        try:
+            if is_dir:
+                shutil.copytree(source, backup_path, copy_function=os.link)
+            else:
+                os.link(source, backup_path)
+            return
+        except FileExistsError:
+            # 同名备份已存在（如同一秒内备份两个同名项目）：它不是本次创建的，不能清理或覆盖
+            raise
+        except OSError:
+            # 文件系统不支持硬链接等情况：os.link 失败不会留下文件，
+            # copytree 失败时清理本次创建的半成品目录，再按原方式复制
+            if is_dir:
+                shutil.rmtree(backup_path, ignore_errors=True)
+    
+    if is_dir:
+        shutil.copytree(source, backup_path)
+    else:
+        shutil.copy2(source, backup_path)
+
+def _safe_delete(file_path: str, backup: bool) -> dict[str, any]:
+    """safe_delete 的同步实现（在线程池中执行）"""
     try:
         path = Path(file_path).expanduser().resolve()
         
@@ -875,10 +1457,9 @@ async def safe_delete(file_path: str, backup: bool = False) -> dict[str, any]:
                 backup_name = f"{file_name}_{timestamp}"
                 backup_path = backup_dir / backup_name
                 
-                if path.is_dir():
-                    shutil.copytree(str(path), str(backup_path))
-                else:
-                    shutil.copy2(str(path), str(backup_path))
+                _backup_item(original_path, str(backup_path), path.is_dir(),
+                             _same_device(original_path, str(backup_dir)))
+                _invalidate_scan_cache(str(backup_path))
             
             # 移动到废纸篓
             target_trash = trash_path / file_name
@@ -887,7 +1468,12 @@ async def safe_delete(file_path: str, backup: bool = False) -> dict[str, any]:
                 target_trash = trash_path / f"{file_name}_{counter}"
                 counter += 1
             
-            shutil.move(str(path), str(target_trash))
+            # 同一文件系统直接 rename（一次系统调用），跨文件系统才交给 shutil.move 复制
+            if _same_device(original_path, str(trash_path)):
+                os.rename(original_path, str(target_trash))
+            else:
+                shutil.move(original_path, str(target_trash))
+            _invalidate_scan_cache(original_path, str(target_trash))
             
             return {
                 "success": True,
@@ -912,5 +1498,56 @@ async def safe_delete(file_path: str, backup: bool = False) -> dict[str, any]:
             "error": f"安全删除失败: {str(e)}"
         }
 
+@mcp.tool()
+async def safe_delete(file_path: str, backup: bool = False) -> dict[str, any]:
+    """安全删除文件（移动到回收站）
+    
+    提供更安全的数据保护方案：
+    1. 支持移动到回收站（macOS）
+    2. 可选备份功能
+    3. 详细的操作记录
+    
+    Args:
+        file_path: 要删除的文件或文件夹路径
+        backup: 是否创建备份
+    
+    Returns:
+        操作结果字典
+    """
+    return await asyncio.to_thread(_safe_delete, file_path, backup)
+
+def _snapshot_directory(directory: str, recursive: bool, ttl: float) -> int:
+    """snapshot_directory 的同步实现（在线程池中执行）"""
+    root = _resolve_dir(directory)
+    with _SCAN_LOCK:
+        _SCAN_CACHE.pop((root, recursive), None)
+    try:
+        entries, _ = _scan(root, recursive, ttl)
+    except OSError:
+        return 0
+    # 快照阶段一并取好 stat，随后并发执行的工具直接读取 DirEntry 上缓存的结果
+    return sum(1 for _ in _with_stat(iter(entries)))
+
+async def snapshot_directory(
+    directory: str = "~/Desktop",
+    recursive: bool = False,
+    ttl: float = 60.0
+) -> int:
+    """预先扫描目录并缓存快照，供随后连续调用的统计工具复用
+    
+    快照有效期内，针对同一目录（及相同 recursive 设置）的 count_files、list_files、
+    get_directory_size、find_duplicate_files 等工具不再重复遍历目录；
+    重命名、移动、删除等写操作会使相关快照失效。不作为MCP工具对外暴露。
+    
+    Args:
+        directory: 目标目录路径，支持~简写
+        recursive: 是否递归子目录
+        ttl: 快照有效期（秒），默认60秒
+    
+    Returns:
+        快照中的文件数量，目录不存在时为0
+    """
+    return await asyncio.to_thread(_snapshot_directory, directory, recursive, ttl)
+
 if __name__ == "__main__":
     mcp.run()
\ No newline at end of file
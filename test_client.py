@@ -5,18 +5,28 @@
 """
 
 import asyncio
-import subprocess
-import json
 import sys
 from pathlib import Path
-import json  # 添加json模块用于解析时间维度功能返回数据
 
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+def _unwrap(result):
+    """asyncio.gather(return_exceptions=True) 的结果：若为异常则重新抛出"""
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+def _write_output(data: bytearray, encoding: str, errors: str) -> None:
+    """把缓冲的输出一次写入标准输出"""
+    sys.stdout.flush()
+    stream = getattr(sys.stdout, "buffer", None)
+    if stream is not None:
+        stream.write(data)
+        stream.flush()
+    else:
+        sys.stdout.write(data.decode(encoding, errors))
 
 async def test_mvp():
     """通过命令行方式测试MCP服务"""
@@ -29,211 +39,254 @@ async def test_mvp():
         count_files, list_files, categorize_files_by_extension,
         get_directory_size, find_large_files,
         find_empty_folders, find_duplicate_files,
-        get_recent_files, get_files_by_date_range, get_file_timeline
+        get_recent_files, get_files_by_date_range, get_file_timeline,
+        snapshot_directory
     )
     
-    # 测试桌面文件统计
-    try:
-        desktop_total = await count_files()
-        print(f"📁 桌面文件总数: {desktop_total}")
-    except Exception as e:
-        print(f"❌ 桌面文件统计失败: {e}")
+    # 下面的测试反复查询桌面，先各扫描一次（递归与非递归），后续调用直接复用快照
+    await asyncio.gather(
+        snapshot_directory("~/Desktop"),
+        snapshot_directory("~/Desktop", recursive=True)
+    )
     
-    # 测试Documents目录PDF
-    try:
-        pdf_count = await count_files("~/Documents", "pdf")
-        print(f"📄 Documents目录PDF文件: {pdf_count}")
-    except Exception as e:
-        print(f"❌ PDF文件统计失败: {e}")
+    # 各项查询互不依赖，且服务端都在线程池中执行，并发发起后按原顺序输出结果
+    (
+        desktop_total, pdf_count, jpg_count, png_files, all_files,
+        categorized, categorized_recursive,
+        desktop_size, desktop_size_mb, recursive_size,
+        large_files, large_files_recursive,
+        empty_folders, duplicate_files,
+        recent_files, date_range_files, timeline, recent_pdfs
+    ) = await asyncio.gather(
+        count_files(),
+        count_files("~/Documents", "pdf"),
+        count_files("~/Downloads", "jpg", True),
+        list_files("~/Desktop", "png", max_results=3),
+        list_files("~/Desktop", recursive=True),
+        categorize_files_by_extension("~/Desktop"),
+        categorize_files_by_extension("~/Desktop", True),
+        get_directory_size("~/Desktop"),
+        get_directory_size("~/Desktop", "MB"),
+        get_directory_size("~/Desktop", "GB", True),
+        find_large_files("~/Desktop", 10),  # 查找超过10MB的文件
+        find_large_files("~/Desktop", 50, True),
+        find_empty_folders("~/Desktop"),
+        find_duplicate_files("~/Desktop"),
+        get_recent_files("~/Desktop", 7, None, False),
+        get_files_by_date_range(
+            "~/Desktop", 
+            "2024-01-01", 
+            "2024-12-31", 
+            None, 
+            False
+        ),
+        get_file_timeline("~/Desktop", 30, "day", False),
+        get_recent_files("~/Desktop", 30, "pdf", False),
+        return_exceptions=True
+    )
     
-    # 测试下载目录JPG（递归）
-    try:
-        jpg_count = await count_files("~/Downloads", "jpg", True)
-        print(f"🖼️ Downloads目录JPG文件（含子目录）: {jpg_count}")
-    except Exception as e:
-        print(f"❌ JPG文件统计失败: {e}")
+    # 结果先写入缓冲区，最后一次性编码输出，避免逐行 print 的加锁与写入开销
+    out = bytearray()
+    encoding = sys.stdout.encoding or "utf-8"
+    errors = sys.stdout.errors or "strict"
     
-    # 测试列出PNG文件
-    try:
-        png_files = await list_files("~/Desktop", "png")
-        if png_files:
-            print(f"🎨 桌面PNG文件（前3个）: {png_files[:3]}")
-        else:
-            print("🎨 桌面无PNG文件")
-    except Exception as e:
-        print(f"❌ PNG文件列表失败: {e}")
+    def emit(text: str) -> None:
+        out.extend(text.encode(encoding, errors))
+        out.extend(b"\n")
     
-    # 测试递归列出所有文件
     try:
-        all_files = await list_files("~/Desktop", recursive=True)
-        if all_files:
-            print(f"📂 桌面所有文件（前5个）: {all_files[:5]}")
-            print(f"📊 桌面文件总数: {len(all_files)}")
-        else:
-            print("📂 桌面无文件")
-    except Exception as e:
-        print(f"❌ 文件列表失败: {e}")
+        # 测试桌面文件统计
+        try:
+            desktop_total = _unwrap(desktop_total)
+            emit(f"📁 桌面文件总数: {desktop_total}")
+        except Exception as e:
+            emit(f"❌ 桌面文件统计失败: {e}")
     
-    # 测试按后缀分类功能
-    print("\n🗂️  按文件后缀分类（桌面）:")
-    print("-" * 40)
-    try:
-        categorized = await categorize_files_by_extension("~/Desktop")
-        if categorized:
-            for ext, files in sorted(categorized.items()):
-                print(f"{ext}: {len(files)}个文件")
-                # 显示前3个文件的完整路径
-                for i, file_path in enumerate(files[:3]):
-                    print(f"  {i+1}. {file_path}")
-                if len(files) > 3:
-                    print(f"  ... 还有{len(files)-3}个文件")
-        else:
-            print("📂 桌面无文件")
-    except Exception as e:
-        print(f"❌ 文件分类失败: {e}")
-    
-    # 测试递归分类
-    print("\n🗂️  按文件后缀分类（桌面-递归）:")
-    print("-" * 40)
-    categorized_recursive = await categorize_files_by_extension("~/Desktop", True)
-    for ext, files in categorized_recursive.items():
-        print(f"{ext}: {len(files)}个文件")
-        if files:
-            print(f"  示例: {files[0]}")
-    
-    # 测试新功能：文件大小统计
-    print("\n📊 文件大小统计测试")
-    print("=" * 50)
-    
-    # 测试目录大小统计
-    desktop_size = await get_directory_size("~/Desktop")
-    print(f"📁 桌面总大小: {desktop_size['formatted_total']}")
-    print(f"📊 文件总数: {desktop_size['total_files']}个")
-    print(f"📏 平均大小: {desktop_size['formatted_average']}")
-    
-    # 测试指定单位的大小统计
-    desktop_size_mb = await get_directory_size("~/Desktop", "MB")
-    print(f"📁 桌面大小(MB): {desktop_size_mb['formatted_total']}")
-    
-    # 测试递归目录大小
-    recursive_size = await get_directory_size("~/Desktop", "GB", True)
-    print(f"📁 桌面递归大小(GB): {recursive_size['formatted_total']}")
-    
-    # 测试大文件识别
-    print("\n🔍 大文件识别测试")
-    print("-" * 30)
-    large_files = await find_large_files("~/Desktop", 10)  # 查找超过10MB的文件
-    if large_files:
-        print(f"发现 {len(large_files)} 个大文件:")
-        for file in large_files[:3]:  # 只显示前3个
-            print(f"  📄 {file['filename']}: {file['size_formatted']}")
-    else:
-        print("未发现超过10MB的大文件")
+        # 测试Documents目录PDF
+        try:
+            pdf_count = _unwrap(pdf_count)
+            emit(f"📄 Documents目录PDF文件: {pdf_count}")
+        except Exception as e:
+            emit(f"❌ PDF文件统计失败: {e}")
     
-    # 测试递归大文件查找
-    large_files_recursive = await find_large_files("~/Desktop", 50, True)
-    if large_files_recursive:
-        print(f"递归查找发现 {len(large_files_recursive)} 个超过50MB的文件")
+        # 测试下载目录JPG（递归）
+        try:
+            jpg_count = _unwrap(jpg_count)
+            emit(f"🖼️ Downloads目录JPG文件（含子目录）: {jpg_count}")
+        except Exception as e:
+            emit(f"❌ JPG文件统计失败: {e}")
     
-    print("\n✅ 文件大小统计功能验证完成！")
-    print("支持：目录总大小、平均大小、智能单位转换、大文件识别")
+        # 测试列出PNG文件
+        try:
+            png_files = _unwrap(png_files)
+            if png_files:
+                emit(f"🎨 桌面PNG文件（前3个）: {png_files[:3]}")
+            else:
+                emit("🎨 桌面无PNG文件")
+        except Exception as e:
+            emit(f"❌ PNG文件列表失败: {e}")
     
-    print("\n✅ 通用文件统计功能验证完成！")
-    print("支持：任意文件类型、任意目录、递归统计、后缀分类")
+        # 测试递归列出所有文件
+        try:
+            all_files = _unwrap(all_files)
+            if all_files:
+                emit(f"📂 桌面所有文件（前5个）: {all_files[:5]}")
+                emit(f"📊 桌面文件总数: {len(all_files)}")
+            else:
+                emit("📂 桌面无文件")
+        except Exception as e:
+            emit(f"❌ 文件列表失败: {e}")
     
-    # 🧪 新增功能测试：空文件夹检测和重复文件查找
-    print("\n🧪 新增功能测试")
-    print("=" * 40)
+        # 测试按后缀分类功能
+        emit("\n🗂️  按文件后缀分类（桌面）:")
+        emit("-" * 40)
+        try:
+            categorized = _unwrap(categorized)
+            if categorized:
+                for ext, files in sorted(categorized.items()):
+                    emit(f"{ext}: {len(files)}个文件")
+                    # 显示前3个文件的完整路径
+                    for i, file_path in enumerate(files[:3]):
+                        emit(f"  {i+1}. {file_path}")
+                    if len(files) > 3:
+                        emit(f"  ... 还有{len(files)-3}个文件")
+            else:
+                emit("📂 桌面无文件")
+        except Exception as e:
+            emit(f"❌ 文件分类失败: {e}")
     
-    # 空文件夹检测
-    empty_folders = await find_empty_folders("~/Desktop")
-    print(f"📁 桌面空文件夹: {len(empty_folders)}个")
-    if empty_folders:
-        for folder in empty_folders[:3]:  # 显示前3个
-            print(f"   📂 {Path(folder).name}")
-    else:
-        print("   ✅ 未发现空文件夹")
-    
-    # 重复文件查找
-    duplicate_files = await find_duplicate_files("~/Desktop")
-    print(f"🔄 桌面重复文件: {len(duplicate_files)}组")
-    if duplicate_files:
-        for hash_val, files in list(duplicate_files.items())[:2]:  # 显示前2组
-            print(f"   📋 重复组: {len(files)}个文件")
-            for file_path in files[:2]:  # 每组显示前2个
-                print(f"      📄 {Path(file_path).name}")
-    else:
-        print("   ✅ 未发现重复文件")
+        # 测试递归分类
+        emit("\n🗂️  按文件后缀分类（桌面-递归）:")
+        emit("-" * 40)
+        for ext, files in _unwrap(categorized_recursive).items():
+            emit(f"{ext}: {len(files)}个文件")
+            if files:
+                emit(f"  示例: {files[0]}")
     
-    # 时间维度功能测试 - 通过MCP客户端调用
-    print("\n" + "="*50)
-    print("时间维度功能测试 (MCP客户端)")
-    print("="*50)
+        # 测试新功能：文件大小统计
+        emit("\n📊 文件大小统计测试")
+        emit("=" * 50)
     
-    # 测试1: 最近7天文件
-    try:
-        from mcp_server import get_recent_files
-        recent_files = await get_recent_files("~/Desktop", 7, None, False)
-        print(f"最近7天修改文件: {len(recent_files)}个")
-        if len(recent_files) > 0:
-            print("最新3个文件:")
-            for file in recent_files[:3]:
-                print(f"  - {file['filename']} ({file['size_formatted']}) - {file['modified_time']}")
+        # 测试目录大小统计
+        desktop_size = _unwrap(desktop_size)
+        emit(f"📁 桌面总大小: {desktop_size['formatted_total']}")
+        emit(f"📊 文件总数: {desktop_size['total_files']}个")
+        emit(f"📏 平均大小: {desktop_size['formatted_average']}")
+    
+        # 测试指定单位的大小统计
+        emit(f"📁 桌面大小(MB): {_unwrap(desktop_size_mb)['formatted_total']}")
+    
+        # 测试递归目录大小
+        emit(f"📁 桌面递归大小(GB): {_unwrap(recursive_size)['formatted_total']}")
+    
+        # 测试大文件识别
+        emit("\n🔍 大文件识别测试")
+        emit("-" * 30)
+        large_files = _unwrap(large_files)
+        if large_files:
+            emit(f"发现 {len(large_files)} 个大文件:")
+            for file in large_files[:3]:  # 只显示前3个
+                emit(f"  📄 {file['filename']}: {file['size_formatted']}")
         else:
-            print("最近7天无文件修改")
-    except Exception as e:
-        print(f"❌ 最近文件查询失败: {e}")
+            emit("未发现超过10MB的大文件")
     
-    # 测试2: 日期范围查询
-    try:
-        from mcp_server import get_files_by_date_range
-        date_range_files = await get_files_by_date_range(
-            "~/Desktop", 
-            "2024-01-01", 
-            "2024-12-31", 
-            None, 
-            False
-        )
-        print(f"\n2024年文件查询: {date_range_files['total_count']}个文件")
-        if date_range_files['files']:
-            print("前3个文件:")
-            for file in date_range_files['files'][:3]:
-                print(f"  - {file['filename']} ({file['size_formatted']}) - {file['modified_time']}")
-    except Exception as e:
-        print(f"❌ 日期范围查询失败: {e}")
+        # 测试递归大文件查找
+        large_files_recursive = _unwrap(large_files_recursive)
+        if large_files_recursive:
+            emit(f"递归查找发现 {len(large_files_recursive)} 个超过50MB的文件")
     
-    # 测试3: 时间线视图
-    try:
-        from mcp_server import get_file_timeline
-        timeline = await get_file_timeline("~/Desktop", 30, "day", False)
-        summary = timeline.get("summary", {})
-        print(f"\n最近30天时间线:")
-        print(f"总文件数: {summary.get('total_files', 0)}个")
-        print(f"总大小: {summary.get('total_size_formatted', '0 B')}")
-        
-        timeline_dict = timeline.get("timeline", {})
-        if timeline_dict:
-            # 显示最近3天
-            recent_days = sorted(timeline_dict.keys(), reverse=True)[:3]
-            for day in recent_days:
-                day_data = timeline_dict[day]
-                print(f"  {day}: {day_data['count']}个文件, {day_data['total_size_formatted']}")
+        emit("\n✅ 文件大小统计功能验证完成！")
+        emit("支持：目录总大小、平均大小、智能单位转换、大文件识别")
+    
+        emit("\n✅ 通用文件统计功能验证完成！")
+        emit("支持：任意文件类型、任意目录、递归统计、后缀分类")
+    
+        # 🧪 新增功能测试：空文件夹检测和重复文件查找
+        emit("\n🧪 新增功能测试")
+        emit("=" * 40)
+    
+        # 空文件夹检测
+        empty_folders = _unwrap(empty_folders)
+        emit(f"📁 桌面空文件夹: {len(empty_folders)}个")
+        if empty_folders:
+            for folder in empty_folders[:3]:  # 显示前3个
+                emit(f"   📂 {Path(folder).name}")
         else:
-            print("时间线视图无数据")
-    except Exception as e:
-        print(f"❌ 时间线视图查询失败: {e}")
+            emit("   ✅ 未发现空文件夹")
     
-    # 测试4: 按扩展名过滤
-    try:
-        recent_pdfs = await get_recent_files("~/Desktop", 30, "pdf", False)
-        print(f"\n最近30天PDF文件: {len(recent_pdfs)}个")
-        if recent_pdfs:
-            for file in recent_pdfs[:2]:
-                print(f"  - {file['filename']} ({file['size_formatted']})")
-    except Exception as e:
-        print(f"❌ PDF文件过滤查询失败: {e}")
+        # 重复文件查找
+        duplicate_files = _unwrap(duplicate_files)
+        emit(f"🔄 桌面重复文件: {len(duplicate_files)}组")
+        if duplicate_files:
+            for hash_val, files in list(duplicate_files.items())[:2]:  # 显示前2组
+                emit(f"   📋 重复组: {len(files)}个文件")
+                for file_path in files[:2]:  # 每组显示前2个
+                    emit(f"      📄 {Path(file_path).name}")
+        else:
+            emit("   ✅ 未发现重复文件")
+    
+        # 时间维度功能测试 - 通过MCP客户端调用
+        emit("\n" + "="*50)
+        emit("时间维度功能测试 (MCP客户端)")
+        emit("="*50)
     
-    print("\n时间维度功能验证完成！")
+        # 测试1: 最近7天文件
+        try:
+            recent_files = _unwrap(recent_files)
+            emit(f"最近7天修改文件: {len(recent_files)}个")
+            if len(recent_files) > 0:
+                emit("最新3个文件:")
+                for file in recent_files[:3]:
+                    emit(f"  - {file['filename']} ({file['size_formatted']}) - {file['modified_time']}")
+            else:
+                emit("最近7天无文件修改")
+        except Exception as e:
+            emit(f"❌ 最近文件查询失败: {e}")
+    
+        # 测试2: 日期范围查询
+        try:
+            date_range_files = _unwrap(date_range_files)
+            emit(f"\n2024年文件查询: {date_range_files['total_count']}个文件")
+            if date_range_files['files']:
+                emit("前3个文件:")
+                for file in date_range_files['files'][:3]:
+                    emit(f"  - {file['filename']} ({file['size_formatted']}) - {file['modified_time']}")
+        except Exception as e:
+            emit(f"❌ 日期范围查询失败: {e}")
+    
+        # 测试3: 时间线视图
+        try:
+            timeline = _unwrap(timeline)
+            summary = timeline.get("summary", {})
+            emit(f"\n最近30天时间线:")
+            emit(f"总文件数: {summary.get('total_files', 0)}个")
+            emit(f"总大小: {summary.get('total_size_formatted', '0 B')}")
+        
+            timeline_dict = timeline.get("timeline", {})
+            if timeline_dict:
+                # 显示最近3天
+                recent_days = sorted(timeline_dict.keys(), reverse=True)[:3]
+                for day in recent_days:
+                    day_data = timeline_dict[day]
+                    emit(f"  {day}: {day_data['count']}个文件, {day_data['total_size_formatted']}")
+            else:
+                emit("时间线视图无数据")
+        except Exception as e:
+            emit(f"❌ 时间线视图查询失败: {e}")
+    
+        # 测试4: 按扩展名过滤
+        try:
+            recent_pdfs = _unwrap(recent_pdfs)
+            emit(f"\n最近30天PDF文件: {len(recent_pdfs)}个")
+            if recent_pdfs:
+                for file in recent_pdfs[:2]:
+                    emit(f"  - {file['filename']} ({file['size_formatted']})")
+        except Exception as e:
+            emit(f"❌ PDF文件过滤查询失败: {e}")
+    
+        emit("\n时间维度功能验证完成！")
+    finally:
+        _write_output(out, encoding, errors)
 
 def run_server_test():
     """运行服务器测试"""
@@ -249,6 +302,13 @@ def run_server_test():
         return False
 
 if __name__ == "__main__":
+    # 已安装 uvloop 时使用更快的事件循环，未安装则保持默认
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    
     # 先测试服务器
     if run_server_test():
         # 再测试功能